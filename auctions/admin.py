@@ -1,17 +1,41 @@
 from django.contrib import admin
-
-from .models import Listing, Bid, Comment, Watchlist, User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_watchlist_count, purge_page_cache
+from .models import Listing, Bid, Category, CategoryFacet, Comment, Watchlist, User
+
+
+def update_active(queryset, active):
+    # Collect affected users first: the changelist queryset may itself filter
+    # on "active" and match nothing once the update has run.
+    user_ids = []
+    if queryset.model is Watchlist:
+        user_ids = set(queryset.values_list("user_id", flat=True))
+    if queryset.model is Listing:
+        listings = Listing.objects.filter(
+            pk__in=list(queryset.values_list("pk", flat=True))
+        )
+        with transaction.atomic(), CategoryFacet.objects.track(listings):
+            listings.update(
+                active=active, version=F("version") + 1, updated=timezone.now()
+            )
+        purge_page_cache()
+    else:
+        queryset.update(active=active)
+    invalidate_watchlist_count(*user_ids)
 
 
 # Register your models here.
 @admin.action(description="Make active")
 def make_active(modeladmin, request, queryset):
-    queryset.update(active=True)
+    update_active(queryset, True)
 
 
 @admin.action(description="Make inactive")
 def make_inactive(modeladmin, request, queryset):
-    queryset.update(active=False)
+    update_active(queryset, False)
 
 
 class ListingAdmin(admin.ModelAdmin):
@@ -19,6 +43,7 @@ class ListingAdmin(admin.ModelAdmin):
         "title",
         "starting_bid",
         "current_bid",
+        "bid_count",
         "category",
         "created",
         "user",
@@ -30,6 +55,12 @@ class ListingAdmin(admin.ModelAdmin):
     actions = [make_active, make_inactive]
 
 
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "parent", "position")
+    list_editable = ("position",)
+    search_fields = ("name",)
+
+
 class BidAdmin(admin.ModelAdmin):
     search_fields = ["user__username", "listing__title"]
     list_display = ["amount", "user", "listing"]
@@ -54,6 +85,7 @@ class UserAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Listing, ListingAdmin)
+admin.site.register(Category, CategoryAdmin)
 admin.site.register(Bid, BidAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Watchlist, WatchlistAdmin)
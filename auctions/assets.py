@@ -0,0 +1,163 @@
+"""CSS bundles, built by ``collectstatic``.
+
+The site's stylesheets are split per page and per component. Served one by
+one, a page view costs up to eight requests for CSS. ``collectstatic``
+(through ``BundledStaticFilesStorage``) concatenates and minifies them into
+the bundles below. The bundles are then hashed by the manifest storage and
+precompressed with gzip and, if the ``brotli`` package is installed, brotli
+by WhiteNoise. Hashed names are served with far-future ``immutable`` cache
+headers.
+
+Order matters: each bundle keeps the cascade order the separate ``<link>``
+tags had. Until ``collectstatic`` has written a manifest (development,
+tests), or with ``DEBUG`` on, templates link the source files instead.
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.templatetags.static import static
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Inlined into every page by ``{% critical_css %}``.
+CRITICAL_CSS = ("css/auctions/styles.css", "css/components/navbar.css")
+# Below the fold on most pages, so loaded without blocking rendering.
+COMPONENTS_CSS = (
+    "css/components/card.css",
+    "css/components/alert.css",
+    "css/components/pagination.css",
+    "css/components/footer.css",
+)
+# Loaded after the page's own styles, which it partly overrides.
+LISTING_CSS = "css/auctions/auctions/styles.css"
+
+BUNDLES = {
+    "critical": CRITICAL_CSS,
+    "components": COMPONENTS_CSS,
+    "index": ("css/auctions/index/styles.css", LISTING_CSS),
+    "login": ("css/auctions/login/styles.css", LISTING_CSS),
+    "register": ("css/auctions/register/styles.css", LISTING_CSS),
+    "categories": ("css/auctions/categories/styles.css", LISTING_CSS),
+    "newAuctions": ("css/auctions/newAuctions/styles.css", LISTING_CSS),
+    "watchlist": ("css/auctions/watchlist/styles.css", LISTING_CSS),
+    "default": (LISTING_CSS,),
+}
+# URL name -> the bundle with that page's styles.
+PAGE_BUNDLES = {
+    "index": "index",
+    "search": "index",
+    "login": "login",
+    "register": "register",
+    "categories": "categories",
+    "addAuctions": "newAuctions",
+    "watchlist": "watchlist",
+}
+
+_STRING = r""""(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'"""
+# An unquoted url(...) may contain ";", "}" or "/*" that are not CSS syntax.
+_URL = r"""(?i:url)\((?:\\.|[^"'\\)])*\)"""
+_VERBATIM = f"{_STRING}|{_URL}"  # Left as they are by minify_css.
+_COMMENTS_AND_SPACE = re.compile(rf"({_VERBATIM})|/\*.*?\*/|\s+", re.DOTALL)
+_PUNCTUATION = re.compile(rf"({_VERBATIM})|\s*([{{}};,])\s*|(:)\s+")
+_LAST_SEMICOLON = re.compile(rf"({_VERBATIM})|;(?=}})")
+
+_critical_css = {}  # hashed bundle name, or source mtimes -> contents
+
+
+def bundle_path(name):
+    return f"css/bundles/{name}.css"
+
+
+def minify_css(css):
+    """Drop comments and whitespace that CSS doesn't need; strings and
+    ``url(...)`` are kept as they are.
+
+    Only the space around ``{ } ; ,`` and after ``:`` goes, so selectors
+    like ``.card :hover`` keep their meaning.
+    """
+
+    def space(match):
+        if match.group(1):
+            return match.group(1)
+        return "" if match.group(0).startswith("/*") else " "
+
+    def punctuation(match):
+        return match.group(1) or match.group(2) or match.group(3)
+
+    css = _COMMENTS_AND_SPACE.sub(space, css)
+    css = _PUNCTUATION.sub(punctuation, css)
+    return _LAST_SEMICOLON.sub(lambda match: match.group(1) or "", css).strip()
+
+
+def build_bundle(name, read):
+    """Return bundle ``name``; ``read(path)`` gives a source file's text."""
+    return "\n".join(minify_css(read(path)) for path in BUNDLES[name]) + "\n"
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """WhiteNoise's manifest storage, writing the CSS bundles first."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for name in BUNDLES:
+                path = bundle_path(name)
+                css = build_bundle(name, self._read)
+                if self.exists(path):
+                    self.delete(path)
+                self.save(path, ContentFile(css.encode()))
+                paths[path] = (self, path)
+        yield from super().post_process(paths, dry_run, **options)
+
+    def stored_name(self, name):
+        # Without a manifest (collectstatic has not run here), serve files
+        # under their own names rather than failing every {% static %}.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def _read(self, path):
+        with self.open(path) as f:
+            return f.read().decode()
+
+
+def _bundled(name):
+    return not settings.DEBUG and bundle_path(name) in getattr(
+        staticfiles_storage, "hashed_files", ()
+    )
+
+
+def stylesheet_urls(name):
+    """The URLs to link for bundle ``name``: the bundle, or its sources."""
+    if _bundled(name):
+        return [static(bundle_path(name))]
+    return [static(path) for path in BUNDLES[name]]
+
+
+def page_bundle(url_name):
+    return PAGE_BUNDLES.get(url_name, "default")
+
+
+def critical_css():
+    """The minified critical CSS, read once per deployed version."""
+    if not _bundled("critical"):
+        # Keyed on the sources' mtimes, so edits show up in development.
+        paths = [finders.find(path) for path in CRITICAL_CSS]
+        key = tuple((path, os.stat(path).st_mtime_ns) for path in paths)
+        if key not in _critical_css:
+            _critical_css[key] = build_bundle("critical", _read_source)
+        return _critical_css[key]
+    name = staticfiles_storage.stored_name(bundle_path("critical"))
+    if name not in _critical_css:
+        with staticfiles_storage.open(name) as f:
+            _critical_css[name] = f.read().decode()
+    return _critical_css[name]
+
+
+def _read_source(path):
+    with open(finders.find(path), encoding="utf-8") as f:
+        return f.read()
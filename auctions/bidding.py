@@ -0,0 +1,188 @@
+"""Batched bid placement for the bulk bid API, and bid stats recomputation."""
+
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import purge_page_cache
+from .db import retry_on_lock
+from .live import publish_listing_event
+from .models import Bid, CategoryFacet, Listing, _sqlite_bid_lock, price_range
+
+MAX_AMOUNT = Decimal("99999999.99")
+
+
+def parse_bid(item):
+    """Return ``(listing_id, amount)`` for a raw bid, or raise ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError("Each bid must be an object.")
+    listing_id = item.get("listing")
+    if not isinstance(listing_id, int) or isinstance(listing_id, bool):
+        raise ValueError("listing must be an integer id.")
+    try:
+        amount = Decimal(str(item.get("amount")))
+    except InvalidOperation:
+        raise ValueError("amount must be a number.") from None
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("The bid must be greater than 0.")
+    if amount > MAX_AMOUNT or amount != amount.quantize(Decimal("0.01")):
+        raise ValueError("amount must have at most 10 digits and 2 decimals.")
+    return listing_id, amount.quantize(Decimal("0.01"))
+
+
+def bid_stats():
+    """Expressions recomputing a listing's denormalized bid stats from ``Bid``.
+
+    For use in ``Listing`` annotations and updates; the top bid is the
+    highest amount, the latest one on ties.
+    """
+    bids = Bid.objects.filter(listing=OuterRef("pk")).order_by()
+    top = bids.order_by("-amount", "-pk")
+    return {
+        "bid_count": Coalesce(
+            Subquery(
+                bids.values("listing").annotate(total=Count("pk")).values("total"),
+                output_field=IntegerField(),
+            ),
+            0,
+        ),
+        "top_bid_user": Subquery(top.values("user")[:1]),
+        "current_bid": Subquery(top.values("amount")[:1]),
+    }
+
+
+def place_bids(user, items):
+    """Validate and apply many bids by ``user`` in one transaction.
+
+    Bids are judged in order, as if placed one after another: a bid is
+    accepted when it beats the listing's current bid and every bid accepted
+    before it. Each listing then gets one conditional UPDATE for all of its
+    accepted bids, and every accepted bid is inserted with one bulk_create.
+    Returns one result dict per input item, in order.
+    """
+    results = [{"index": index} for index in range(len(items))]
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = parse_bid(item)
+        except ValueError as e:
+            results[index].update(status="rejected", error=str(e))
+
+    if connection.vendor == "sqlite":
+        with _sqlite_bid_lock:
+            retry_on_lock(_apply_bids, user, parsed, results)
+    else:
+        _apply_bids(user, parsed, results)
+    return results
+
+
+def _apply_bids(user, parsed, results):
+    now = timezone.now()
+    with transaction.atomic():
+        listing_ids = {listing_id for listing_id, _ in parsed.values()}
+        state = {
+            row["pk"]: row
+            for row in Listing.objects.filter(pk__in=listing_ids).values(
+                "pk",
+                "current_bid",
+                "starting_bid",
+                "bid_count",
+                "active",
+                "ends_at",
+                "category",
+            )
+        }
+        prices = {
+            pk: (
+                row["starting_bid"]
+                if row["current_bid"] is None
+                else row["current_bid"]
+            )
+            for pk, row in state.items()
+        }
+
+        accepted = defaultdict(list)
+        for index, (listing_id, amount) in parsed.items():
+            results[index].update(listing=listing_id, amount=str(amount))
+            listing = state.get(listing_id)
+            if listing is None:
+                error = "Listing does not exist."
+            elif not listing["active"] or (
+                listing["ends_at"] is not None and listing["ends_at"] <= now
+            ):
+                error = "This auction has ended."
+            elif (
+                listing["current_bid"] is not None and amount <= listing["current_bid"]
+            ):
+                error = "The bid must be higher than the current bid."
+            else:
+                listing["current_bid"] = amount
+                accepted[listing_id].append(index)
+                continue
+            results[index].update(status="rejected", error=error)
+
+        bids = []
+        facet_changes = Counter()
+        for listing_id, indexes in accepted.items():
+            lowest = parsed[indexes[0]][1]
+            highest = parsed[indexes[-1]][1]
+            # Still guarded like place_bid: a concurrent writer may have
+            # raised the bid since the state above was read.
+            updated = (
+                Listing.objects.filter(pk=listing_id, active=True)
+                .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+                .filter(Q(current_bid__isnull=True) | Q(current_bid__lt=lowest))
+                .update(
+                    current_bid=highest,
+                    bid_count=F("bid_count") + len(indexes),
+                    top_bid_user=user,
+                    version=F("version") + 1,
+                    updated=now,
+                )
+            )
+            status = {"status": "accepted"}
+            if not updated:
+                status = {
+                    "status": "rejected",
+                    "error": "The bid must be higher than the current bid.",
+                }
+            for index in indexes:
+                results[index].update(status)
+            if not updated:
+                continue
+            listing = state[listing_id]
+            previous = prices[listing_id]
+            if price_range(previous) != price_range(highest):
+                # As in Listing.place_bid: only a stale read can hide a move
+                # out of the previous range; the new bids are not in yet.
+                previous = (
+                    Bid.objects.filter(listing_id=listing_id).aggregate(
+                        top=Max("amount")
+                    )["top"]
+                    or listing["starting_bid"]
+                )
+                facet_changes[listing["category"], price_range(previous)] -= 1
+                facet_changes[listing["category"], price_range(highest)] += 1
+            bids.extend(
+                Bid(user=user, listing_id=listing_id, amount=parsed[index][1])
+                for index in indexes
+            )
+            publish_listing_event(
+                listing_id,
+                {
+                    "type": "bid",
+                    "current_bid": str(highest),
+                    "bid_count": listing["bid_count"] + len(indexes),
+                    "bidder": user.username,
+                },
+            )
+
+        Bid.objects.bulk_create(bids)
+        CategoryFacet.objects.adjust(facet_changes)
+        if bids:
+            # bulk_create skips the post_save signal that normally purges.
+            transaction.on_commit(purge_page_cache)
@@ -0,0 +1,129 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from .models import Watchlist
+
+# Upper bound on how stale a count can get if a write path forgets to
+# invalidate it (e.g. editing a Watchlist row from the admin change form).
+WATCHLIST_COUNT_TIMEOUT = 300
+
+
+def watchlist_count_key(user_id):
+    return f"auctions:watchlist_count:{user_id}"
+
+
+def get_watchlist_count(user_id):
+    key = watchlist_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Watchlist.objects.filter(user_id=user_id, active=True).count()
+        cache.set(key, count, WATCHLIST_COUNT_TIMEOUT)
+    return count
+
+
+async def aget_watchlist_count(user_id):
+    key = watchlist_count_key(user_id)
+    count = await cache.aget(key)
+    if count is None:
+        count = await Watchlist.objects.filter(user_id=user_id, active=True).acount()
+        await cache.aset(key, count, WATCHLIST_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_watchlist_count(*user_ids):
+    cache.delete_many([watchlist_count_key(user_id) for user_id in user_ids])
+
+
+async def ainvalidate_watchlist_count(*user_ids):
+    await cache.adelete_many([watchlist_count_key(user_id) for user_id in user_ids])
+
+
+PAGE_CACHE_GENERATION_KEY = "auctions:page_cache:generation"
+# Only these parameters change what the cached pages render; anything else
+# in the query string is ignored so it cannot fragment the cache.
+PAGE_CACHE_PARAMS = ("category", "price", "cursor", "page")
+
+
+def purge_page_cache():
+    """Drop every cached anonymous page by moving to a new key generation."""
+    try:
+        cache.incr(PAGE_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(PAGE_CACHE_GENERATION_KEY, 1, None)
+
+
+def page_cache_key(request, generation):
+    params = "&".join(
+        f"{name}={request.GET.get(name, '')}" for name in PAGE_CACHE_PARAMS
+    )
+    return f"auctions:page:{generation}:{request.path}?{params}"
+
+
+def _bypass_page_cache(request, user):
+    # Both checks only touch the database when the request carries a
+    # session cookie, so anonymous cache hits need no queries at all.
+    return (
+        not getattr(settings, "ANONYMOUS_PAGE_CACHE_TIMEOUT", 0)
+        or request.method != "GET"
+        or user.is_authenticated
+        or len(messages.get_messages(request))
+    )
+
+
+def _cacheable(response):
+    patch_vary_headers(response, ["Cookie"])
+    return response.status_code == 200 and not response.cookies
+
+
+def anonymous_page_cache(view):
+    """Serve anonymous GETs of ``view`` from the cache.
+
+    Requests from authenticated users, or with messages waiting to be shown,
+    always reach the view. Responses that set cookies are never stored.
+    Disabled when ``ANONYMOUS_PAGE_CACHE_TIMEOUT`` is 0. Works on both sync
+    and async views.
+    """
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # auser() loads the session asynchronously, so the messages
+            # check that follows finds it already cached on the request.
+            if _bypass_page_cache(request, await request.auser()):
+                return await view(request, *args, **kwargs)
+
+            generation = await cache.aget(PAGE_CACHE_GENERATION_KEY, 0)
+            key = page_cache_key(request, generation)
+            response = await cache.aget(key)
+            if response is not None:
+                return response
+
+            response = await view(request, *args, **kwargs)
+            if _cacheable(response):
+                await cache.aset(key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if _bypass_page_cache(request, request.user):
+            return view(request, *args, **kwargs)
+
+        generation = cache.get(PAGE_CACHE_GENERATION_KEY, 0)
+        key = page_cache_key(request, generation)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = view(request, *args, **kwargs)
+        if _cacheable(response):
+            cache.set(key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,118 @@
+"""The category tree, cached in each process.
+
+Categories change rarely, through the admin, but are needed on most pages:
+the listing form's dropdown, the category cards and facets, and the name on
+every listing card. The whole table is loaded in one query and kept for
+``CATEGORY_TREE_TTL`` seconds; saving or deleting a category drops the copy
+in the process that did it, and other processes pick it up on their next
+reload.
+"""
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from .models import Category
+
+CATEGORY_TREE_TTL = 60
+
+_lock = threading.Lock()
+_cached = None  # (tree, loaded at)
+
+
+class CategoryTree:
+    """All categories, with each one's descendants worked out up front."""
+
+    def __init__(self, categories):
+        self.by_id = {category.pk: category for category in categories}
+        # Changes whenever a category is added, renamed, moved or deleted;
+        # part of the cache key of fragments that show category names.
+        self.generation = hashlib.sha256(
+            repr(sorted((c.pk, c.name, c.parent_id) for c in categories)).encode()
+        ).hexdigest()[:16]
+        self.by_name = {category.name: category for category in categories}
+        self.children = defaultdict(list)
+        self.roots = []
+        for category in categories:
+            if category.parent_id in self.by_id:
+                self.children[category.parent_id].append(category)
+            else:
+                self.roots.append(category)
+
+        # Depth-first, so every category comes before its descendants.
+        self.ordered = []
+        stack = [(root, 0) for root in reversed(self.roots)]
+        while stack:
+            category, depth = stack.pop()
+            self.ordered.append((category, depth))
+            stack.extend(
+                (child, depth + 1) for child in reversed(self.children[category.pk])
+            )
+        self.descendants = {}
+        for category, _ in reversed(self.ordered):
+            self.descendants[category.pk] = frozenset({category.pk}).union(
+                *(self.descendants[child.pk] for child in self.children[category.pk])
+            )
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def name(self, pk):
+        category = self.by_id.get(pk)
+        return category.name if category else ""
+
+    def root_of(self, category):
+        # Bounded, in case a cycle was saved around Category.clean().
+        for _ in range(len(self.by_id)):
+            if category.parent_id not in self.by_id:
+                break
+            category = self.by_id[category.parent_id]
+        return category
+
+    def subtree_ids(self, category):
+        """The ids of ``category`` and all categories below it."""
+        return self.descendants.get(category.pk, frozenset({category.pk}))
+
+    def filter_listings(self, listings, name):
+        """Narrow ``listings`` to the category called ``name`` and those below it."""
+        category = self.by_name.get(name)
+        if category is None:
+            return listings.none()
+        ids = self.subtree_ids(category)
+        if len(ids) == 1:
+            # A plain equality can walk the (category, created) index in order.
+            return listings.filter(category_id=category.pk)
+        return listings.filter(category_id__in=ids)
+
+    def choices(self):
+        """``(id, label)`` pairs for a select, children indented under parents."""
+        return [
+            (category.pk, "— " * depth + category.name)
+            for category, depth in self.ordered
+        ]
+
+
+def get_category_tree():
+    global _cached
+    cached = _cached
+    if cached is None or time.monotonic() - cached[1] > CATEGORY_TREE_TTL:
+        with _lock:
+            if _cached is cached or _cached is None:
+                _cached = CategoryTree(list(Category.objects.all())), time.monotonic()
+            cached = _cached
+    return cached[0]
+
+
+async def aget_category_tree():
+    cached = _cached
+    if cached is not None and time.monotonic() - cached[1] <= CATEGORY_TREE_TTL:
+        return cached[0]
+    return await sync_to_async(get_category_tree)()
+
+
+def invalidate_category_tree():
+    global _cached
+    _cached = None
@@ -0,0 +1,64 @@
+"""ASGI WebSocket endpoint streaming live listing events."""
+
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .live import get_broker, listing_channel
+from .models import Listing
+
+LISTING_PATH = re.compile(r"^/ws/listing/(?P<listing_id>\d+)/?$")
+
+
+async def listing_updates(scope, receive, send, listing_id):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    # Outside the request cycle, so do what its signals would: drop broken
+    # and expired connections before and after using one.
+    await sync_to_async(close_old_connections)()
+    try:
+        exists = await Listing.objects.filter(pk=listing_id).aexists()
+    finally:
+        await sync_to_async(close_old_connections)()
+    if not exists:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    await send({"type": "websocket.accept"})
+
+    broker = get_broker()
+    channel = listing_channel(listing_id)
+    queue = broker.subscribe(channel)
+    next_event = asyncio.ensure_future(queue.get())
+    next_message = asyncio.ensure_future(receive())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {next_event, next_message}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_event in done:
+                event = next_event.result()
+                await send({"type": "websocket.send", "text": json.dumps(event)})
+                next_event = asyncio.ensure_future(queue.get())
+            if next_message in done:
+                # Clients never need to send anything; frames other than a
+                # disconnect are ignored.
+                if next_message.result()["type"] == "websocket.disconnect":
+                    return
+                next_message = asyncio.ensure_future(receive())
+    finally:
+        next_event.cancel()
+        next_message.cancel()
+        broker.unsubscribe(channel, queue)
+
+
+async def websocket_application(scope, receive, send):
+    match = LISTING_PATH.match(scope["path"])
+    if match is None:
+        await receive()
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    await listing_updates(scope, receive, send, int(match["listing_id"]))
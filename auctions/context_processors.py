@@ -1,9 +1,12 @@
-from .models import Watchlist
+from .cache import get_watchlist_count
 
 
 def watchlist_count(request):
-    if request.user.is_authenticated:
-        count = Watchlist.objects.filter(user=request.user, active=True).count()
-    else:
-        count = 0
+    # Async views load the count ahead of rendering (see views.arender).
+    count = getattr(request, "watchlist_count", None)
+    if count is None:
+        if request.user.is_authenticated:
+            count = get_watchlist_count(request.user.pk)
+        else:
+            count = 0
     return {"watchlist_count": count}
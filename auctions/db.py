@@ -0,0 +1,69 @@
+"""SQLite tuning for small deployments that run without ``DATABASE_URL``.
+
+With ``SQLITE_PROFILE = "production"`` (the default), every new SQLite
+connection gets ``SQLITE_PRAGMAS``:
+
+- WAL: readers no longer block the writer, nor the writer the readers.
+- ``synchronous=NORMAL``: in WAL mode, commits skip the fsync. A power
+  loss can drop the last transactions but never corrupts the database.
+- ``busy_timeout``: wait up to 5 s for the write lock instead of failing.
+- ``mmap_size`` and ``cache_size``: serve reads from memory.
+
+The settings also begin transactions with ``BEGIN IMMEDIATE``, so a write
+transaction takes the write lock up front. A transaction that reads first
+and then tries to upgrade to a write can hit a deadlock, which SQLite
+reports at once as "database is locked" without waiting. What can still
+fail after the busy timeout, ``retry_on_lock`` retries.
+"""
+
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # Negative: KiB rather than pages.
+}
+LOCK_RETRIES = 3
+LOCK_BACKOFF = 0.05  # Seconds before the first retry, doubling after.
+
+
+def configure_sqlite(connection):
+    if (
+        connection.vendor != "sqlite"
+        or getattr(settings, "SQLITE_PROFILE", "") != "production"
+    ):
+        return
+    # On the DB-API connection, so the pragmas don't show up as queries.
+    for name, value in SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def is_lock_error(error):
+    message = str(error)
+    return "database is locked" in message or "database table is locked" in message
+
+
+def retry_on_lock(func, *args, **kwargs):
+    """Call ``func``, retrying with backoff while the database is locked.
+
+    Only a whole transaction can be retried. Inside an outer atomic block
+    the error is raised at once.
+    """
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if (
+                attempt == LOCK_RETRIES
+                or not is_lock_error(e)
+                or transaction.get_connection().in_atomic_block
+            ):
+                raise
+        # Jittered, so the writers that collided don't collide again.
+        time.sleep(LOCK_BACKOFF * 2**attempt * random.uniform(0.5, 1.5))
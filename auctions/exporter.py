@@ -0,0 +1,166 @@
+"""Export of listings, bids and comments as CSV or JSON Lines.
+
+Rows are read in primary key order, ``chunk_size`` at a time. Each chunk is
+one query for the rows after the last key of the previous chunk, so memory
+stays flat however large the table is, and no cursor or read transaction is
+held open for the length of the export. Every chunk is encoded, and
+optionally gzipped, before the next one is read.
+
+With ``since``, only rows created at or after that time are exported; for
+listings, rows changed since then (bids, closing and edits all touch
+``updated``). Columns are a superset of the ones ``import_auctions`` reads.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Bid, Comment, Listing
+
+# Model, the field ``since`` filters on, and column name -> lookup.
+EXPORTS = {
+    "listings": (
+        Listing,
+        "updated",
+        {
+            "id": "id",
+            "title": "title",
+            "description": "description",
+            "category": "category__name",
+            "image": "image",
+            "starting_bid": "starting_bid",
+            "current_bid": "current_bid",
+            "bid_count": "bid_count",
+            "user": "user__username",
+            "top_bidder": "top_bid_user__username",
+            "winner": "winner__username",
+            "active": "active",
+            "ends_at": "ends_at",
+            "created": "created",
+            "updated": "updated",
+        },
+    ),
+    "bids": (
+        Bid,
+        "created",
+        {
+            "id": "id",
+            "listing_id": "listing_id",
+            "listing": "listing__title",
+            "user": "user__username",
+            "amount": "amount",
+            "created": "created",
+        },
+    ),
+    "comments": (
+        Comment,
+        "created",
+        {
+            "id": "id",
+            "listing_id": "listing_id",
+            "listing": "listing__title",
+            "user": "user__username",
+            "text": "text",
+            "created": "created",
+        },
+    ),
+}
+KINDS = tuple(EXPORTS)
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime; naive values are in the current timezone."""
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"{value!r} is not a date or datetime.")
+        since = datetime.combine(date, time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def _chunk(kind, since, after, chunk_size):
+    model, since_field, columns = EXPORTS[kind]
+    queryset = model.objects.order_by("pk").values_list(*columns.values())
+    if since is not None:
+        queryset = queryset.filter(**{f"{since_field}__gte": since})
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    return queryset[:chunk_size]
+
+
+def export_chunks(kind, since=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to ``chunk_size`` row tuples, the id first."""
+    after = None
+    while chunk := list(_chunk(kind, since, after, chunk_size)):
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][0]
+
+
+async def aexport_chunks(kind, since=None, chunk_size=CHUNK_SIZE):
+    """Async counterpart of ``export_chunks``."""
+    after = None
+    while chunk := [row async for row in _chunk(kind, since, after, chunk_size)]:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][0]
+
+
+class Encoder:
+    """Encode chunks of rows as CSV or JSON Lines bytes, gzipped if asked."""
+
+    def __init__(self, kind, format="csv", gzip=False):
+        self.columns = list(EXPORTS[kind][2])
+        self.format = format
+        self.exported = 0
+        # wbits 31 writes a gzip header and trailer around the deflate stream.
+        self._compressor = zlib.compressobj(wbits=31) if gzip else None
+
+    def header(self):
+        return self._output(self._csv([self.columns]) if self.format == "csv" else "")
+
+    def encode(self, chunk):
+        self.exported += len(chunk)
+        if self.format == "csv":
+            return self._output(self._csv(chunk))
+        return self._output(
+            "".join(
+                json.dumps(dict(zip(self.columns, row)), cls=DjangoJSONEncoder) + "\n"
+                for row in chunk
+            )
+        )
+
+    def close(self):
+        return self._compressor.flush() if self._compressor else b""
+
+    def _output(self, text):
+        data = text.encode()
+        return self._compressor.compress(data) if self._compressor else data
+
+    @staticmethod
+    def _csv(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+
+async def aexport(kind, since=None, format="csv", gzip=False, chunk_size=CHUNK_SIZE):
+    """Yield the whole export as bytes, for a ``StreamingHttpResponse``."""
+    encoder = Encoder(kind, format, gzip)
+    yield encoder.header()
+    async for chunk in aexport_chunks(kind, since, chunk_size):
+        yield encoder.encode(chunk)
+    yield encoder.close()
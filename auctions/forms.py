@@ -2,31 +2,42 @@ import re
 
 from django import forms
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
+from .categories import get_category_tree
 from .models import Listing, Bid, Comment
 
 
+def category_choices():
+    return get_category_tree().choices()
+
+
 class ListingForm(forms.ModelForm):
-    CATEGORY_CHOICES = [
-        # ('value', 'display_name')
-        ("Fashion", "Fashion"),
-        ("Toys", "Toys"),
-        ("Electronics", "Electronics"),
-        ("Home", "Home"),
-        ("Books", "Books"),
-        ("Other", "Other"),
-    ]
-    category = forms.ChoiceField(choices=CATEGORY_CHOICES, widget=forms.Select)
+    # Choices come from the cached category tree rather than a
+    # ModelChoiceField, which would query the categories on every render.
+    category = forms.TypedChoiceField(
+        choices=category_choices, coerce=int, widget=forms.Select
+    )
 
     class Meta:
         model = Listing
-        fields = ["title", "description", "starting_bid", "image", "category"]
+        fields = [
+            "title",
+            "description",
+            "starting_bid",
+            "image",
+            "category",
+            "ends_at",
+        ]
         error_messages = {
             "image": {
                 "invalid": "Please enter a valid URL (https//).",
             }
         }
 
+    def clean_category(self):
+        return get_category_tree().get(self.cleaned_data["category"])
+
     def clean_title(self):
         title = self.cleaned_data.get("title")
         if title == "":
@@ -49,6 +60,12 @@ class ListingForm(forms.ModelForm):
             raise forms.ValidationError("Starting bid must be positive.")
         return starting_bid
 
+    def clean_ends_at(self):
+        ends_at = self.cleaned_data.get("ends_at")
+        if ends_at is not None and ends_at <= timezone.now():
+            raise forms.ValidationError("The end time must be in the future.")
+        return ends_at
+
     def clean_image(self):
         url = self.cleaned_data.get("image")
         if url:
@@ -68,7 +85,6 @@ class BidForm(forms.ModelForm):
 
     def clean_amount(self):
         bid_value = self.cleaned_data.get("amount")
-        print(bid_value)
         if bid_value is None:
             raise forms.ValidationError("The bid value cannot be empty.")
         if bid_value <= 0:
@@ -0,0 +1,74 @@
+"""Publish/subscribe of live listing events for the WebSocket endpoint.
+
+Events are published from sync code (views, ``Listing.place_bid``) and
+consumed by the ASGI consumer in ``auctions.consumers``. The broker is chosen
+by the ``LIVE_UPDATES_BROKER`` setting; the default in-process broker only
+reaches subscribers served by the same process.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from functools import cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def listing_channel(listing_id):
+    return f"listing.{listing_id}"
+
+
+class InProcessBroker:
+    """Fan messages out to asyncio queues subscribed in this process."""
+
+    # Whether messages published in one process reach subscribers in others.
+    # A separate scheduler process (``close_auctions --loop``) needs a broker
+    # that sets this.
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        """Return a queue receiving messages for ``channel``.
+
+        Must be called from the event loop that will read the queue.
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers[channel]
+            subscribers -= {entry for entry in subscribers if entry[1] is queue}
+            if not subscribers:
+                del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        """Deliver ``message`` to every subscriber; safe from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The subscriber's event loop has shut down.
+                self.unsubscribe(channel, queue)
+
+
+@cache
+def get_broker():
+    path = getattr(settings, "LIVE_UPDATES_BROKER", "auctions.live.InProcessBroker")
+    return import_string(path)()
+
+
+def publish_listing_event(listing_id, event):
+    """Publish ``event`` for a listing once the current transaction commits."""
+    transaction.on_commit(
+        lambda: get_broker().publish(listing_channel(listing_id), event)
+    )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import scheduler
+
+
+class Command(BaseCommand):
+    help = "Close auctions whose end time has passed and pick their winners."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Listings closed per query batch.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running as a worker instead of exiting when done.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between passes with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        if options["loop"]:
+            # In a process of its own, the closed events and page cache
+            # purges would otherwise never reach the web processes.
+            problems = scheduler.unshared_services()
+            if problems:
+                raise CommandError(
+                    "close_auctions --loop runs apart from the web processes, "
+                    f"but {' and '.join(problems)}. Configure a shared broker "
+                    "and cache."
+                )
+            scheduler.run(options["interval"], options["batch_size"], self.stdout)
+            return
+        closed = scheduler.close_due_auctions(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} auction(s)."))
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from auctions.exporter import CHUNK_SIZE, KINDS, Encoder, export_chunks, parse_since
+from auctions.importer import FORMATS
+
+
+class Command(BaseCommand):
+    help = "Export listings, bids or comments to a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument(
+            "output", help="File to write; a .gz suffix gzips it on the fly."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Output format; by default taken from the file extension.",
+        )
+        parser.add_argument(
+            "--since",
+            metavar="DATETIME",
+            help=(
+                "Only rows created (listings: changed) at or after this ISO "
+                "date or datetime."
+            ),
+        )
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Rows read per query.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["output"])
+        gzip = options["gzip"] or path.suffix == ".gz"
+        format = options["format"] or FORMATS.get(
+            (path.with_suffix("") if path.suffix == ".gz" else path).suffix.lower(),
+            "csv",
+        )
+        try:
+            since = parse_since(options["since"]) if options["since"] else None
+        except ValueError as e:
+            raise CommandError(e)
+
+        # Rows changed while the export runs may or may not be in it, so the
+        # next incremental export starts from the time this one started.
+        started = timezone.now()
+        encoder = Encoder(options["kind"], format, gzip)
+        try:
+            with open(path, "wb") as output:
+                output.write(encoder.header())
+                chunks = export_chunks(options["kind"], since, options["chunk_size"])
+                output.writelines(encoder.encode(chunk) for chunk in chunks)
+                output.write(encoder.close())
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {encoder.exported} {options['kind']}.")
+        )
+        self.stdout.write(f"Next incremental export: --since {started.isoformat()}")
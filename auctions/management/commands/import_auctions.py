@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.importer import KINDS, import_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import users, listings, bids and comments from CSV or JSON Lines "
+        "files, in that order."
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f"--{kind}", metavar="FILE", help=f"File of {kind}.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format; by default taken from each file's extension.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows validated and inserted per chunk.",
+        )
+        parser.add_argument(
+            "--password-hasher",
+            metavar="DOTTED_PATH",
+            help=(
+                "Password hasher for imported users, e.g. "
+                "django.contrib.auth.hashers.MD5PasswordHasher for test data."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in KINDS if options[kind]}
+        if not paths:
+            raise CommandError(
+                "Pass at least one of --users, --listings, --bids or --comments."
+            )
+        try:
+            results = import_files(
+                paths,
+                options["batch_size"],
+                options["password_hasher"],
+                options["format"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        for result in results:
+            self.stdout.write(
+                self.style.SUCCESS(f"Imported {result.imported} {result.kind}")
+                + (f", skipped {result.skipped}." if result.skipped else ".")
+            )
+            for error in result.errors:
+                self.stderr.write(f"  {error}")
+            if result.skipped > len(result.errors):
+                self.stderr.write(
+                    f"  ... and {result.skipped - len(result.errors)} more."
+                )
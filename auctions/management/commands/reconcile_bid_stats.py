@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from auctions.bidding import bid_stats
+from auctions.cache import purge_page_cache
+from auctions.models import CategoryFacet, Listing
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill and reconcile Listing.bid_count, Listing.top_bid_user and "
+        "Listing.current_bid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many listings have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        stats = bid_stats()
+        no_bid = Value(-1, output_field=DecimalField())
+
+        drifted = (
+            Listing.objects.annotate(
+                actual_count=stats["bid_count"],
+                top_key=Coalesce("top_bid_user", 0),
+                actual_top_key=Coalesce(stats["top_bid_user"], 0),
+                current_key=Coalesce("current_bid", no_bid),
+                actual_current_key=Coalesce(stats["current_bid"], no_bid),
+            )
+            .filter(
+                ~Q(bid_count=F("actual_count"))
+                | ~Q(top_key=F("actual_top_key"))
+                | ~Q(current_key=F("actual_current_key"))
+            )
+            .values_list("pk", flat=True)
+        )
+        drifted_ids = list(drifted)
+        self.stdout.write(f"{len(drifted_ids)} listing(s) out of sync.")
+        if options["dry_run"] or not drifted_ids:
+            return
+
+        updated = 0
+        for start in range(0, len(drifted_ids), BATCH_SIZE):
+            batch = Listing.objects.filter(
+                pk__in=drifted_ids[start : start + BATCH_SIZE]
+            )
+            # Bump the version too, so cached cards, pages and API validators
+            # stop serving the drifted values.
+            updated += batch.update(
+                **stats, version=F("version") + 1, updated=timezone.now()
+            )
+        if updated:
+            # A corrected price can move listings between facet ranges.
+            CategoryFacet.objects.rebuild()
+            purge_page_cache()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} listing(s)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from auctions.cache import purge_page_cache
+from auctions.models import CategoryFacet
+
+
+class Command(BaseCommand):
+    help = "Recount the category facet counters from the active listings."
+
+    def handle(self, *args, **options):
+        fixed = CategoryFacet.objects.rebuild()
+        if fixed:
+            purge_page_cache()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} facet(s)."))
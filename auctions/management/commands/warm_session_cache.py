@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from auctions import sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the unexpired sessions in the database into the cache, e.g. after "
+        "switching SESSION_ENGINE to auctions.sessions. Optional: sessions are "
+        "cached on first use anyway."
+    )
+
+    def handle(self, *args, **options):
+        count = sessions.warm_cache()
+        self.stdout.write(self.style.SUCCESS(f"Cached {count} session(s)."))
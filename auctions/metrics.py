@@ -0,0 +1,230 @@
+"""In-process request metrics, exported in the Prometheus text format.
+
+``MetricsMiddleware`` opens a ``RequestStats`` for every request and keeps it
+in a context variable. The database execute wrapper and the timed template
+backend add to whichever request is current, including from the threads that
+run sync code for async views (``sync_to_async`` copies the context). When
+the response is done the totals go into per-view counters, latency
+histograms and ring buffers of recent samples.
+
+Everything lives in the process that served the request, so with several
+worker processes each one is a separate scrape target.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Recent requests per view kept for the quantiles.
+RING_SIZE = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+_current = ContextVar("auctions_request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.count = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.recent_latency = deque(maxlen=RING_SIZE)
+        self.recent_queries = deque(maxlen=RING_SIZE)
+
+    def observe(self, latency, stats):
+        self.count += 1
+        self.latency_sum += latency
+        self.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.queries += stats.queries
+        self.query_time += stats.query_time
+        self.template_time += stats.template_time
+        self.recent_latency.append(latency)
+        self.recent_queries.append(stats.queries)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, latency, stats):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            metrics.observe(latency, stats)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        """Return ``(view, metrics)`` pairs, copied so rendering needs no lock."""
+        with self._lock:
+            views = []
+            for view, metrics in sorted(self._views.items()):
+                copy = ViewMetrics()
+                copy.__dict__.update(metrics.__dict__)
+                copy.buckets = list(metrics.buckets)
+                copy.recent_latency = sorted(metrics.recent_latency)
+                copy.recent_queries = sorted(metrics.recent_queries)
+                views.append((view, copy))
+            return views
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        views = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(
+                    f'{key}="{_escape(label)}"' for key, label in labels
+                )
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format(value)}")
+
+        def histogram(view, metrics):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), metrics.buckets):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                yield "_bucket", (("view", view), ("le", le)), cumulative
+            yield "_sum", (("view", view),), metrics.latency_sum
+            yield "_count", (("view", view),), metrics.count
+
+        def summary(view, recent):
+            for quantile in QUANTILES:
+                value = _quantile(recent, quantile)
+                yield "", (("view", view), ("quantile", f"{quantile:g}")), value
+
+        family(
+            "auctions_request_duration_seconds",
+            "histogram",
+            "Request latency by view.",
+            [sample for view, m in views for sample in histogram(view, m)],
+        )
+        family(
+            "auctions_recent_request_duration_seconds",
+            "summary",
+            f"Latency quantiles over the last {RING_SIZE} requests by view.",
+            [sample for view, m in views for sample in summary(view, m.recent_latency)],
+        )
+        family(
+            "auctions_recent_db_queries",
+            "summary",
+            f"Queries per request over the last {RING_SIZE} requests by view.",
+            [sample for view, m in views for sample in summary(view, m.recent_queries)],
+        )
+        for name, attribute, help_text in (
+            ("auctions_db_queries_total", "queries", "Database queries by view."),
+            (
+                "auctions_db_query_seconds_total",
+                "query_time",
+                "Time spent executing database queries by view.",
+            ),
+            (
+                "auctions_template_render_seconds_total",
+                "template_time",
+                "Time spent rendering templates by view.",
+            ),
+        ):
+            family(
+                name,
+                "counter",
+                help_text,
+                [("", (("view", view),), getattr(m, attribute)) for view, m in views],
+            )
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value):
+    if isinstance(value, float):
+        return "NaN" if math.isnan(value) else repr(value)
+    return str(value)
+
+
+def _quantile(values, quantile):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+
+def start_request():
+    """Begin collecting stats for the current request; returns a reset token."""
+    return _current.set(RequestStats())
+
+
+def finish_request(token, view, latency):
+    stats = _current.get()
+    _current.reset(token)
+    registry.observe(view, latency, stats)
+
+
+def record_queries(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook counting queries of the request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render.
+
+    Includes and extends render inside the top-level template, so they are
+    counted once as part of it.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,135 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, routers
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that can also run in an async middleware chain.
+
+    WhiteNoise itself is sync-only, so under ASGI Django would run every
+    request, async views included, through one sync thread to call it.
+    Looking up a static file is an in-memory dict hit (unless autorefresh is
+    on), so the async path does that inline and only awaits the rest of the
+    chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record latency, query and template stats per URL name.
+
+    See ``auctions.metrics``; the numbers are served at ``/metrics``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        token = metrics.start_request()
+        try:
+            return self.get_response(request)
+        finally:
+            metrics.finish_request(
+                token, _view_name(request), time.perf_counter() - start
+            )
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        token = metrics.start_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            metrics.finish_request(
+                token, _view_name(request), time.perf_counter() - start
+            )
+
+
+class ReplicaMiddleware:
+    """Route the request's reads to replicas unless it must see fresh data.
+
+    See ``auctions.routers``. After a request that wrote, the response sets
+    a short-lived cookie pinning the user's next requests to the primary.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.start_request(_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.finish_request(token)
+        return _stick(response, state)
+
+    async def __acall__(self, request):
+        token = routers.start_request(_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routers.finish_request(token)
+        return _stick(response, state)
+
+
+def _pinned(request):
+    return (
+        request.method not in routers.SAFE_METHODS
+        or routers.STICKY_COOKIE in request.COOKIES
+    )
+
+
+def _stick(response, state):
+    if state.wrote and routers.replicas():
+        response.set_cookie(
+            routers.STICKY_COOKIE,
+            "1",
+            max_age=settings.REPLICA_STICKY_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unmatched>"
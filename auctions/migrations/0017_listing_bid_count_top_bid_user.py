@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0016_comment_created"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="bid_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="top_bid_user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="leading_listings",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
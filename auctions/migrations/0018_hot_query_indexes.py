@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:08
+
+from django.db import migrations, models
+
+
+def remove_duplicate_watchlist_rows(apps, schema_editor):
+    # Keep one row per (user, listing), preferring an active one, so the
+    # unique constraint below can be created on existing data.
+    Watchlist = apps.get_model("auctions", "Watchlist")
+    seen = set()
+    duplicates = []
+    rows = Watchlist.objects.order_by("user_id", "listing_id", "-active", "id")
+    for pk, user_id, listing_id in rows.values_list("pk", "user_id", "listing_id"):
+        if (user_id, listing_id) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((user_id, listing_id))
+    Watchlist.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0017_listing_bid_count_top_bid_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(
+                fields=["listing", "-amount"], name="bid_listing_amount_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["-created"],
+                name="listing_active_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["category", "-created"],
+                name="listing_cat_active_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(fields=["title"], name="listing_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="watchlist",
+            index=models.Index(
+                fields=["user", "active"], name="watchlist_user_active_idx"
+            ),
+        ),
+        migrations.RunPython(
+            remove_duplicate_watchlist_rows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="watchlist",
+            constraint=models.UniqueConstraint(
+                fields=("user", "listing"), name="unique_watchlist_user_listing"
+            ),
+        ),
+    ]
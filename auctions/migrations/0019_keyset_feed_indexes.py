@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0018_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="listing",
+            name="listing_active_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="listing",
+            name="listing_cat_active_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["-created", "-id"],
+                name="listing_active_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["category", "-created", "-id"],
+                name="listing_cat_active_created_idx",
+            ),
+        ),
+    ]
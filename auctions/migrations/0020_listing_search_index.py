@@ -0,0 +1,52 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE auctions_listing ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    (
+        "CREATE INDEX listing_search_vector_idx ON auctions_listing"
+        " USING gin (search_vector)"
+    ),
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS listing_search_vector_idx",
+    "ALTER TABLE auctions_listing DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARD = [
+    (
+        "CREATE VIRTUAL TABLE auctions_listing_fts USING fts5("
+        "title, description, tokenize = 'porter unicode61', prefix = '3')"
+    ),
+    (
+        "INSERT INTO auctions_listing_fts (rowid, title, description)"
+        " SELECT id, title, description FROM auctions_listing"
+    ),
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS auctions_listing_fts"]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {"postgresql": postgres, "sqlite": sqlite}
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("auctions", "0019_keyset_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
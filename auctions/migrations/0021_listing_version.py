@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0020_listing_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0021_listing_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="ends_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["ends_at"],
+                name="listing_active_ends_at_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0022_listing_ends_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(fields=["updated"], name="listing_updated_idx"),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0023_listing_updated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bid",
+            name="created",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-17 23:50
+
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+
+from django.db import migrations, models
+
+PRICE_RANGES = (Decimal(25), Decimal(100), Decimal(500), Decimal(1000))
+CATEGORIES = ("Fashion", "Toys", "Electronics", "Home", "Books", "Other")
+
+
+def count_facets(apps, schema_editor):
+    Listing = apps.get_model("auctions", "Listing")
+    CategoryFacet = apps.get_model("auctions", "CategoryFacet")
+    # Every known category and range gets a row up front, so counting a
+    # listing is a single UPDATE.
+    counts = Counter(
+        {
+            (category, index): 0
+            for category in CATEGORIES
+            for index in range(len(PRICE_RANGES) + 1)
+        }
+    )
+    rows = Listing.objects.filter(active=True).values_list(
+        "category", "current_bid", "starting_bid"
+    )
+    for category, current_bid, starting_bid in rows.iterator():
+        price = starting_bid if current_bid is None else current_bid
+        counts[category, bisect_right(PRICE_RANGES, price)] += 1
+    CategoryFacet.objects.bulk_create(
+        CategoryFacet(category=category, price_range=index, count=count)
+        for (category, index), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0024_bid_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("category", models.CharField(max_length=64)),
+                ("price_range", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("category", "price_range"), name="unique_category_facet"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
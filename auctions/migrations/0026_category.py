@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Listing.category moves from the category name to a key into Category in
+# three steps, so that on PostgreSQL the foreign keys written by the data
+# migration (0027) are checked before 0028 alters auctions_listing again.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0025_categoryfacet"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Category",
+            fields=[
+                ("id", models.SmallAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("position", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "parent",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="children",
+                        to="auctions.category",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "categories",
+                "ordering": ["position", "name"],
+            },
+        ),
+        # Listing.category: from the category name to a key into Category.
+        migrations.AddField(
+            model_name="listing",
+            name="category_ref",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="listings",
+                to="auctions.category",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:05
+
+from django.db import migrations
+
+# The choices ListingForm used to hard-code, in their display order.
+CATEGORIES = ("Fashion", "Toys", "Electronics", "Home", "Books", "Other")
+
+
+def create_categories(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    Listing = apps.get_model("auctions", "Listing")
+    names = list(CATEGORIES)
+    used = Listing.objects.exclude(category="").values_list("category", flat=True)
+    names += sorted(set(used.distinct()) - set(names))
+    Category.objects.bulk_create(
+        Category(name=name, position=position) for position, name in enumerate(names)
+    )
+
+
+def link_listings(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    Listing = apps.get_model("auctions", "Listing")
+    for category in Category.objects.all():
+        Listing.objects.filter(category=category.name).update(category_ref=category)
+
+
+def unlink_listings(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    Listing = apps.get_model("auctions", "Listing")
+    for category in Category.objects.all():
+        Listing.objects.filter(category_ref=category).update(category=category.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0026_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_categories, migrations.RunPython.noop),
+        migrations.RunPython(link_listings, unlink_listings),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:05
+
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PRICE_RANGES = (Decimal(25), Decimal(100), Decimal(500), Decimal(1000))
+
+
+def count_facets(apps, schema_editor):
+    Category = apps.get_model("auctions", "Category")
+    Listing = apps.get_model("auctions", "Listing")
+    CategoryFacet = apps.get_model("auctions", "CategoryFacet")
+    counts = Counter(
+        {
+            (category_id, index): 0
+            for category_id in Category.objects.values_list("pk", flat=True)
+            for index in range(len(PRICE_RANGES) + 1)
+        }
+    )
+    rows = Listing.objects.filter(active=True, category__isnull=False).values_list(
+        "category_id", "current_bid", "starting_bid"
+    )
+    for category_id, current_bid, starting_bid in rows.iterator():
+        price = starting_bid if current_bid is None else current_bid
+        counts[category_id, bisect_right(PRICE_RANGES, price)] += 1
+    CategoryFacet.objects.bulk_create(
+        CategoryFacet(category_id=category_id, price_range=index, count=count)
+        for (category_id, index), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auctions", "0027_link_listing_categories"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="listing",
+            name="listing_cat_active_created_idx",
+        ),
+        migrations.RemoveField(
+            model_name="listing",
+            name="category",
+        ),
+        migrations.RenameField(
+            model_name="listing",
+            old_name="category_ref",
+            new_name="category",
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["category", "-created", "-id"],
+                name="listing_cat_active_created_idx",
+            ),
+        ),
+        # The facet counters are recounted against the new keys.
+        migrations.DeleteModel(
+            name="CategoryFacet",
+        ),
+        migrations.CreateModel(
+            name="CategoryFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("price_range", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="facets",
+                        to="auctions.category",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("category", "price_range"), name="unique_category_facet"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
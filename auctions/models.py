@@ -1,13 +1,90 @@
+import threading
+from bisect import bisect_right
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .live import publish_listing_event
+
+# SQLite only allows a single writer, so bids placed from threads of the same
+# process are serialized here instead of failing with "database is locked".
+_sqlite_bid_lock = threading.Lock()
+
+ENDING_SOON = timedelta(hours=24)
+
+# Upper bounds of the price ranges active listings are counted in for the
+# category facets; the last range is open-ended. A listing's price is its
+# current bid, or its starting bid before the first bid.
+PRICE_RANGES = (Decimal(25), Decimal(100), Decimal(500), Decimal(1000))
+# The listing fields that decide which facet counter it is in.
+FACET_FIELDS = ("category_id", "active", "starting_bid", "current_bid")
+
+
+def price_range(price):
+    """Return the index of the price range ``price`` falls in."""
+    return bisect_right(PRICE_RANGES, price)
+
+
+def _facet_key(state):
+    """The ``(category id, price range)`` a listing's field values count in."""
+    price = state["current_bid"]
+    if price is None:
+        price = state["starting_bid"]
+    return state["category_id"], price_range(price)
+
+
+def price_range_bounds(index):
+    """Return ``(low, high)`` of a price range; ``None`` means unbounded."""
+    low = PRICE_RANGES[index - 1] if index > 0 else None
+    high = PRICE_RANGES[index] if index < len(PRICE_RANGES) else None
+    return low, high
 
 
 class User(AbstractUser):
     pass
 
 
+class Category(models.Model):
+    # A small integer key keeps the foreign key and its indexes narrow.
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=64, unique=True)
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.PROTECT,
+        related_name="children",
+        blank=True,
+        null=True,
+    )
+    # Display order among siblings.
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["position", "name"]
+        verbose_name_plural = "categories"
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        parent = self.parent
+        while parent is not None:
+            if parent.pk == self.pk:
+                raise ValidationError(
+                    {"parent": "A category cannot be nested inside itself."}
+                )
+            parent = parent.parent
+
+
 class Listing(models.Model):
     title = models.CharField(max_length=64, blank=True)
     description = models.TextField(blank=True)
@@ -16,10 +93,17 @@ class Listing(models.Model):
         max_digits=10, decimal_places=2, blank=True, null=True
     )
     image = models.URLField(blank=True)
-    category = models.CharField(max_length=64, blank=True)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.PROTECT,
+        related_name="listings",
+        blank=True,
+        null=True,
+    )
     created = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="listings")
     active = models.BooleanField(default=True)
+    ends_at = models.DateTimeField(blank=True, null=True)
     winner = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -27,10 +111,115 @@ class Listing(models.Model):
         blank=True,
         null=True,
     )
+    bid_count = models.PositiveIntegerField(default=0)
+    top_bid_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="leading_listings",
+        blank=True,
+        null=True,
+    )
+    # Bumped on every change that alters how the listing renders; used to key
+    # cached fragments of it.
+    version = models.PositiveIntegerField(default=0)
+    # Set together with version; the Last-Modified time of the JSON API.
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Partial indexes: Django filters booleans as a bare "WHERE active",
+            # which SQLite can only serve from an index carrying that condition.
+            models.Index(
+                fields=["-created", "-id"],
+                condition=Q(active=True),
+                name="listing_active_created_idx",
+            ),
+            models.Index(
+                fields=["category", "-created", "-id"],
+                condition=Q(active=True),
+                name="listing_cat_active_created_idx",
+            ),
+            models.Index(fields=["title"], name="listing_title_idx"),
+            models.Index(fields=["updated"], name="listing_updated_idx"),
+            models.Index(
+                fields=["ends_at"],
+                condition=Q(active=True),
+                name="listing_active_ends_at_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.starting_bid}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in FACET_FIELDS):
+            instance._saved_facet_state = instance._facet_state()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self._adjust_facets()
+            return
+        update_fields = kwargs.get("update_fields")
+        # Increment in the database so concurrent writers never share a
+        # version number for different content.
+        self.version = F("version") + 1
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version", "updated"}
+            saved = {
+                field
+                for field in FACET_FIELDS
+                if field in update_fields or field.removesuffix("_id") in update_fields
+            }
+        else:
+            saved = set(FACET_FIELDS)
+        if not saved:
+            super().save(*args, **kwargs)
+        elif hasattr(self, "_saved_facet_state"):
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                self._adjust_facets(saved)
+        else:
+            # Loaded without the fields the facets need: count in the database.
+            with transaction.atomic(), CategoryFacet.objects.track(
+                Listing.objects.filter(pk=self.pk)
+            ):
+                super().save(*args, **kwargs)
+            self.__dict__.pop("_saved_facet_state", None)
+        # Read back on first use rather than on every save.
+        del self.__dict__["version"]
+
+    def _facet_state(self):
+        return {field: getattr(self, field) for field in FACET_FIELDS}
+
+    def _adjust_facets(self, saved=FACET_FIELDS):
+        """Move the listing's facet count from its last saved state to the
+        values of the ``saved`` fields."""
+        old = getattr(self, "_saved_facet_state", None)
+        new = {**(old or {}), **{field: getattr(self, field) for field in saved}}
+        self._saved_facet_state = new
+        changes = Counter()
+        if old is not None and old["active"]:
+            changes[_facet_key(old)] -= 1
+        if new["active"]:
+            changes[_facet_key(new)] += 1
+        CategoryFacet.objects.adjust(changes)
+
+    @property
+    def price(self):
+        return self.starting_bid if self.current_bid is None else self.current_bid
+
+    @property
+    def is_ending_soon(self):
+        if not self.active or self.ends_at is None:
+            return False
+        now = timezone.now()
+        return now < self.ends_at <= now + ENDING_SOON
+
     def get_remove_url(self, request=None):
         relative_url = reverse("watchlist_remove", args=[self.id])
         if request:
@@ -38,17 +227,182 @@ class Listing(models.Model):
         return relative_url
 
     def place_bid(self, user, bid_value):
-        if self.current_bid is not None and bid_value <= self.current_bid:
-            raise ValidationError("The bid must be higher than the current bid.")
+        """Raise current_bid with a conditional UPDATE and record the bid.
+
+        The updated row count tells whether the bid won, so concurrent bids
+        cannot overwrite a higher one and the listing is never read back.
+        """
+        if connection.vendor == "sqlite":
+            with _sqlite_bid_lock:
+                retry_on_lock(self._place_bid, user, bid_value)
+        else:
+            self._place_bid(user, bid_value)
         self.current_bid = bid_value
-        self.save()
-        Bid.objects.create(user=user, listing=self, amount=bid_value)
+        self.bid_count += 1
+        self.top_bid_user = user
+        if "version" in self.__dict__:  # Else read back when first used.
+            self.version += 1
+        if hasattr(self, "_saved_facet_state"):
+            # _place_bid moved the facet count to the new price.
+            self._saved_facet_state["current_bid"] = bid_value
+        publish_listing_event(
+            self.pk,
+            {
+                "type": "bid",
+                "current_bid": str(bid_value),
+                "bid_count": self.bid_count,
+                "bidder": user.username,
+            },
+        )
+
+    def _place_bid(self, user, bid_value):
+        with transaction.atomic():
+            accepted = (
+                Listing.objects.filter(pk=self.pk, active=True)
+                .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now()))
+                .filter(Q(current_bid__isnull=True) | Q(current_bid__lt=bid_value))
+                .update(
+                    current_bid=bid_value,
+                    bid_count=F("bid_count") + 1,
+                    top_bid_user=user,
+                    version=F("version") + 1,
+                    updated=timezone.now(),
+                )
+            )
+            if not accepted:
+                # Explain the rejection from what this instance already knows.
+                if not self.active or (
+                    self.ends_at is not None and self.ends_at <= timezone.now()
+                ):
+                    raise ValidationError("This auction has ended.")
+                raise ValidationError("The bid must be higher than the current bid.")
+            previous = self.price
+            if price_range(previous) != price_range(bid_value):
+                # Bids only raise the price, so the listing can only have
+                # left the previous range if this instance is stale; read
+                # the real previous price before adding ours.
+                previous = (
+                    Bid.objects.filter(listing=self).aggregate(top=Max("amount"))["top"]
+                    or self.starting_bid
+                )
+                CategoryFacet.objects.move(self.category_id, previous, bid_value)
+            Bid.objects.create(user=user, listing=self, amount=bid_value)
+
+
+class CategoryFacetManager(models.Manager):
+    def tally(self, listings):
+        """Count the active ``listings`` by ``(category id, price range)``."""
+        price = Coalesce("current_bid", "starting_bid")
+        ranges = Case(
+            *(
+                When(price__lt=bound, then=Value(index))
+                for index, bound in enumerate(PRICE_RANGES)
+            ),
+            default=Value(len(PRICE_RANGES)),
+        )
+        rows = (
+            listings.filter(active=True, category__isnull=False)
+            .order_by()
+            .alias(price=price)
+            .values("category", price_range=ranges)
+            .annotate(count=Count("pk"))
+        )
+        return Counter(
+            {(row["category"], row["price_range"]): row["count"] for row in rows}
+        )
+
+    def adjust(self, changes):
+        """Add ``{(category_id, price_range): delta}`` to the counters.
+
+        Listings without a category are not counted.
+        """
+        for (category_id, index), delta in changes.items():
+            if not delta or category_id is None:
+                continue
+            facet = self.filter(category_id=category_id, price_range=index)
+            if not facet.update(count=F("count") + delta):
+                self.bulk_create(
+                    [self.model(category_id=category_id, price_range=index)],
+                    ignore_conflicts=True,
+                )
+                facet.update(count=F("count") + delta)
+
+    def move(self, category_id, old_price, new_price):
+        """Move an active listing between price ranges after its price changed."""
+        changes = Counter()
+        changes[category_id, price_range(old_price)] -= 1
+        changes[category_id, price_range(new_price)] += 1
+        self.adjust(changes)
+
+    @contextmanager
+    def track(self, listings):
+        """Count the facet changes the block makes to ``listings``.
+
+        For set-based updates: ``listings`` is tallied before and after the
+        block, so it must select the same rows both times (e.g. by pk).
+        """
+        before = self.tally(listings)
+        yield
+        changes = self.tally(listings)
+        changes.subtract(before)
+        self.adjust(changes)
+
+    def rebuild(self):
+        """Recount every facet from the listings; return the counters fixed."""
+        counts = self.tally(Listing.objects.all())
+        fixed = 0
+        with transaction.atomic():
+            for facet in self.select_for_update():
+                count = counts.pop((facet.category_id, facet.price_range), 0)
+                if facet.count != count:
+                    facet.count = count
+                    facet.save(update_fields=["count"])
+                    fixed += 1
+            self.bulk_create(
+                self.model(category_id=category_id, price_range=index, count=count)
+                for (category_id, index), count in counts.items()
+            )
+        return fixed + len(counts)
+
+
+class CategoryFacet(models.Model):
+    """Active listings per category and price range, kept up to date on
+    every change instead of grouping all listings for each request.
+
+    Writers adjust the counters in the transaction that changes the
+    listings; ``reconcile_category_facets`` recounts them if they drift.
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="facets"
+    )
+    price_range = models.PositiveSmallIntegerField()
+    # Not positive: a counter that drifted must not make a close fail.
+    count = models.IntegerField(default=0)
+
+    objects = CategoryFacetManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "price_range"], name="unique_category_facet"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} #{self.price_range}: {self.count}"
 
 
 class Bid(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids")
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name="bids")
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing", "-amount"], name="bid_listing_amount_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} bid {self.amount} on {self.listing.title}"
@@ -73,5 +427,15 @@ class Watchlist(models.Model):
     )
     active = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "listing"], name="unique_watchlist_user_listing"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "active"], name="watchlist_user_active_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} added {self.listing.title} to watchlist"
@@ -0,0 +1,152 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def encode_cursor(direction, created=None, pk=None):
+    key = [direction, created.isoformat() if created else None, pk]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        direction, created, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        if created is None:
+            # Only the last-page cursor walks back from no boundary row.
+            return (PREVIOUS, None, None) if direction == PREVIOUS else None
+        return direction, datetime.fromisoformat(created), int(pk)
+    except (binascii.Error, TypeError, ValueError):
+        return None
+
+
+def _key(row):
+    # Rows are model instances, or dicts from a .values() queryset.
+    if isinstance(row, dict):
+        return row["created"], row["id"]
+    return row.created, row.pk
+
+
+class CursorPage:
+    """A page of a keyset-paginated feed, ordered newest first."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # A cursor that walks back from the oldest row, i.e. the last page.
+        self.last_cursor = encode_cursor(PREVIOUS)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginate a queryset on (created, id) descending without COUNT or OFFSET.
+
+    Each page is a single indexed range query: rows strictly after the
+    boundary row of the previous page, plus one extra row to tell whether
+    another page exists.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, token=None):
+        queryset, forward, has_other = self._plan(token)
+        return self._paginate(list(queryset), forward, has_other)
+
+    async def aget_page(self, token=None):
+        queryset, forward, has_other = self._plan(token)
+        return self._paginate([row async for row in queryset], forward, has_other)
+
+    def _plan(self, token):
+        """Return the page query, its direction and whether the far side has rows."""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self._forward(self.queryset), True, False
+        direction, created, pk = cursor
+        if direction == NEXT:
+            after = Q(created__lt=created) | Q(created=created, id__lt=pk)
+            return self._forward(self.queryset.filter(after)), True, True
+        if created is None:
+            return self._backward(self.queryset), False, False
+        before = Q(created__gt=created) | Q(created=created, id__gt=pk)
+        return self._backward(self.queryset.filter(before)), False, True
+
+    def _forward(self, queryset):
+        return queryset.order_by("-created", "-id")[: self.per_page + 1]
+
+    def _backward(self, queryset):
+        return queryset.order_by("created", "id")[: self.per_page + 1]
+
+    def _paginate(self, rows, forward, has_other):
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if forward:
+            return self._page(rows, has_next=has_more, has_previous=has_other)
+        return self._page(rows[::-1], has_next=has_other, has_previous=has_more)
+
+    @staticmethod
+    def _page(rows, has_next, has_previous):
+        if not rows:
+            return CursorPage(rows)
+        first, last = _key(rows[0]), _key(rows[-1])
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor(NEXT, *last) if has_next else None,
+            previous_cursor=encode_cursor(PREVIOUS, *first) if has_previous else None,
+        )
+
+
+def paginate_listings(request, queryset, per_page=10):
+    """Return a page of ``queryset`` for the feed views.
+
+    Feeds are keyset-paginated through the ``cursor`` parameter; the old
+    ``?page=N`` links still work through Django's offset ``Paginator``.
+    """
+    if "page" in request.GET and "cursor" not in request.GET:
+        return Paginator(queryset, per_page).get_page(request.GET.get("page"))
+    return CursorPaginator(queryset, per_page).get_page(request.GET.get("cursor"))
+
+
+def _offset_page(queryset, per_page, number):
+    page = Paginator(queryset, per_page).get_page(number)
+    page.object_list = list(page.object_list)
+    return page
+
+
+async def apaginate_listings(request, queryset, per_page=10):
+    """Async counterpart of ``paginate_listings`` returning an evaluated page."""
+    if "page" in request.GET and "cursor" not in request.GET:
+        return await sync_to_async(_offset_page)(
+            queryset, per_page, request.GET.get("page")
+        )
+    paginator = CursorPaginator(queryset, per_page)
+    return await paginator.aget_page(request.GET.get("cursor"))
@@ -0,0 +1,88 @@
+"""Read replicas, with read-your-writes for the user who wrote.
+
+Writes always go to the primary (``default``). Reads go to a random alias
+from ``DATABASE_REPLICAS`` only inside a request (see
+``ReplicaMiddleware``), and only when it is safe to read stale data. They
+stay on the primary:
+
+- for requests that are not GET, HEAD or OPTIONS;
+- for requests carrying the ``STICKY_COOKIE``, set on a response for
+  ``REPLICA_STICKY_SECONDS`` after its request wrote anything (a bid, a
+  comment, a watchlist change, a login's session), so the user sees their
+  own writes despite replication lag;
+- once the request has written, and inside transactions, where a read is
+  usually followed by a write based on it;
+- outside requests: management commands and the auction scheduler.
+
+Only the models of ``REPLICATED_APPS`` are routed. Others, such as the
+``CacheEntry`` of ``DatabaseCache``, are left to Django's default: the
+primary, without a cache write pinning the user to it.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "use_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+REPLICATED_APPS = frozenset({"auctions", "auth", "sessions"})
+
+
+class RequestState:
+    def __init__(self, pinned):
+        # Mutated rather than replaced, so that writes made in the threads
+        # of sync_to_async are seen by the middleware.
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar("auctions_db_state", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def start_request(pinned):
+    return _state.set(RequestState(pinned))
+
+
+def finish_request(token):
+    """End the request started by ``start_request``; return its state."""
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in REPLICATED_APPS:
+            return None
+        state = _state.get()
+        if (
+            not replicas()
+            or state is None
+            or state.pinned
+            or state.wrote
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in REPLICATED_APPS:
+            return None
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in replicas() else None
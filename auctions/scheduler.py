@@ -0,0 +1,78 @@
+"""Close auctions whose ``ends_at`` has passed, in set-based batches."""
+
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import purge_page_cache
+from .live import get_broker, publish_listing_event
+from .models import CategoryFacet, Listing
+
+
+def close_due_batch(batch_size=1000, now=None):
+    """Close up to ``batch_size`` due auctions and return how many closed.
+
+    A batch is one indexed SELECT of due ids and one UPDATE that copies the
+    denormalized top bidder into ``winner``, whatever the batch size, plus
+    the grouped counts that keep the category facets in step.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = Listing.objects.filter(active=True, ends_at__lte=now).order_by("ends_at")
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several schedulers work through the backlog side by side.
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return 0
+        with CategoryFacet.objects.track(Listing.objects.filter(pk__in=ids)):
+            closed = Listing.objects.filter(pk__in=ids, active=True).update(
+                active=False,
+                winner=F("top_bid_user"),
+                version=F("version") + 1,
+                updated=timezone.now(),
+            )
+        winners = Listing.objects.filter(pk__in=ids).values_list(
+            "pk", "winner__username"
+        )
+        for listing_id, winner in winners:
+            publish_listing_event(listing_id, {"type": "closed", "winner": winner})
+        transaction.on_commit(purge_page_cache)
+    return closed
+
+
+def close_due_auctions(batch_size=1000, now=None):
+    """Close every auction that is due, batch by batch."""
+    total = 0
+    while closed := close_due_batch(batch_size, now):
+        total += closed
+    return total
+
+
+def unshared_services():
+    """Describe what a scheduler in its own process could not reach the web
+    processes through: the broker of the closed events, and the cache whose
+    pages are purged when auctions close."""
+    problems = []
+    broker = get_broker()
+    if not getattr(broker, "shared", False):
+        problems.append(
+            f"LIVE_UPDATES_BROKER ({type(broker).__name__}) only reaches "
+            "subscribers in its own process"
+        )
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        problems.append("the default cache is local to each process")
+    return problems
+
+
+def run(interval=5.0, batch_size=1000, stdout=None):
+    """Close due auctions forever, sleeping ``interval`` seconds when idle."""
+    while True:
+        closed = close_due_auctions(batch_size)
+        if closed and stdout is not None:
+            stdout.write(f"Closed {closed} auction(s).")
+        time.sleep(interval)
@@ -0,0 +1,135 @@
+"""Ranked full-text search over listing titles and descriptions.
+
+PostgreSQL keeps a weighted ``tsvector`` in a generated, GIN-indexed
+``search_vector`` column. SQLite keeps an FTS5 table, ``auctions_listing_fts``,
+in sync through signals. Both are created by migration 0020 and hidden
+behind :func:`search_listings`.
+"""
+
+import re
+
+from django.db import connection
+
+from .models import Listing
+
+FTS_TABLE = "auctions_listing_fts"
+WORD_RE = re.compile(r"\w+")
+
+
+class PostgresSearchBackend:
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM auctions_listing"
+                " WHERE active AND search_vector @@ plainto_tsquery('english', %s)",
+                [terms],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM auctions_listing, plainto_tsquery('english', %s) query"
+                " WHERE active AND search_vector @@ query"
+                " ORDER BY ts_rank(search_vector, query) DESC, id DESC"
+                " LIMIT %s OFFSET %s",
+                [terms, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, listings):
+        # The generated column is maintained by PostgreSQL on every write.
+        pass
+
+    def remove(self, listing_ids):
+        pass
+
+
+class SQLiteSearchBackend:
+    @staticmethod
+    def match_expression(terms):
+        # Quote every word so user input can never be parsed as FTS5 syntax,
+        # and let a last word of three or more letters match as a prefix.
+        words = WORD_RE.findall(terms)
+        quoted = [f'"{word}"' for word in words]
+        if words and len(words[-1]) >= 3:
+            quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {FTS_TABLE}"
+                f" JOIN auctions_listing ON auctions_listing.id = {FTS_TABLE}.rowid"
+                f" WHERE {FTS_TABLE} MATCH %s AND auctions_listing.active",
+                [self.match_expression(terms)],
+            )
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE}"
+                f" JOIN auctions_listing ON auctions_listing.id = {FTS_TABLE}.rowid"
+                f" WHERE {FTS_TABLE} MATCH %s AND auctions_listing.active"
+                # Title matches weigh ten times as much as description matches.
+                f" ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), {FTS_TABLE}.rowid DESC"
+                " LIMIT %s OFFSET %s",
+                [self.match_expression(terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, listings):
+        listings = list(listings)
+        self.remove([listing.pk for listing in listings])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)",
+                [
+                    (listing.pk, listing.title, listing.description)
+                    for listing in listings
+                ],
+            )
+
+    def remove(self, listing_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(pk,) for pk in listing_ids],
+            )
+
+
+def get_search_backend():
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return SQLiteSearchBackend()
+
+
+class SearchResults:
+    """Lazily ranked search results that Django's Paginator can slice."""
+
+    def __init__(self, terms, backend=None):
+        self.terms = terms
+        self.backend = backend or get_search_backend()
+
+    def count(self):
+        if not WORD_RE.search(self.terms):
+            return 0
+        return self.backend.count(self.terms)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start = index.start or 0
+        if not WORD_RE.search(self.terms) or index.stop is None:
+            return []
+        ids = self.backend.ranked_ids(self.terms, index.stop - start, start)
+        listings = Listing.objects.in_bulk(ids)
+        return [listings[pk] for pk in ids if pk in listings]
+
+
+def search_listings(terms):
+    return SearchResults(terms)
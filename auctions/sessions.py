@@ -0,0 +1,86 @@
+"""Sessions read from the cache, and written only when they change.
+
+``cached_db`` keeps each session in the cache as well as in the
+``django_session`` table. Once the cache is warm, a logged-in request loads
+its session without a query. The table stays the source of truth for cache
+misses, restarts and evictions, so switching ``SESSION_ENGINE`` between this
+store and ``django.contrib.sessions.backends.db`` keeps everyone logged in.
+
+This store also coalesces writes. A session marked modified whose data is
+the same as when it was loaded (a key set to its old value, messages stored
+and read in one request) is not written again until ``SESSION_WRITE_INTERVAL``
+seconds after its last write. Rolling expiry (``SESSION_SAVE_EVERY_REQUEST``)
+then costs at most one write per interval instead of one per request.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+SAVED_AT_KEY = "_session_saved_at"
+
+
+class SessionStore(cached_db.SessionStore):
+    # The data as loaded or last saved, serialized; None if never loaded.
+    _snapshot = None
+    _saved_at = 0
+
+    def load(self):
+        return self._remember(super().load())
+
+    async def aload(self):
+        return self._remember(await super().aload())
+
+    def save(self, must_create=False):
+        if not self._unchanged(must_create):
+            self._session[SAVED_AT_KEY] = int(time.time())
+            super().save(must_create)
+            self._remember(self._session)
+
+    async def asave(self, must_create=False):
+        if not self._unchanged(must_create):
+            session = await self._aget_session()
+            session[SAVED_AT_KEY] = int(time.time())
+            await super().asave(must_create)
+            self._remember(session)
+
+    def _remember(self, data):
+        self._snapshot = self._serialize(data)
+        self._saved_at = data.get(SAVED_AT_KEY, 0)
+        return data
+
+    def _unchanged(self, must_create):
+        # A snapshot means the data was loaded, so _session_cache is set.
+        return (
+            not must_create
+            and self._snapshot is not None
+            and self.session_key is not None
+            and self._serialize(self._session_cache) == self._snapshot
+            and time.time() - self._saved_at < settings.SESSION_WRITE_INTERVAL
+        )
+
+    def _serialize(self, data):
+        data = {key: value for key, value in data.items() if key != SAVED_AT_KEY}
+        return self.serializer().dumps(data)
+
+
+def warm_cache():
+    """Copy the unexpired sessions in the database into the cache.
+
+    Optional: sessions are cached on first use anyway. Only useful with a
+    cache shared by all workers. Returns the number of sessions cached.
+    """
+    count = 0
+    sessions = Session.objects.filter(expire_date__gt=timezone.now())
+    for session in sessions.iterator():
+        store = SessionStore(session.session_key)
+        store._cache.set(
+            store.cache_key,
+            store.decode(session.session_data),
+            store.get_expiry_age(expiry=session.expire_date),
+        )
+        count += 1
+    return count
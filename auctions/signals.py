@@ -0,0 +1,58 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import purge_page_cache
+from .categories import invalidate_category_tree
+from .db import configure_sqlite
+from .metrics import record_queries
+from .models import Bid, Category, CategoryFacet, Listing, price_range
+from .search import get_search_backend
+
+SEARCH_FIELDS = {"title", "description"}
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reload_category_tree(sender, **kwargs):
+    invalidate_category_tree()
+    purge_page_cache()
+
+
+@receiver(post_delete, sender=Listing)
+def uncount_listing(sender, instance, **kwargs):
+    if instance.active:
+        CategoryFacet.objects.adjust(
+            {(instance.category_id, price_range(instance.price)): -1}
+        )
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Bid)
+def purge_cached_pages(sender, **kwargs):
+    purge_page_cache()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    configure_sqlite(connection)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Installed once per connection object rather than per request, so async
+    # views whose queries run in another thread are counted too.
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
@@ -0,0 +1,25 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def critical_css():
+    """Inline the critical CSS bundle in a ``<style>`` element."""
+    css = assets.critical_css().replace("</", "<\\/")
+    return mark_safe(f"<style>{css}</style>")
+
+
+@register.simple_tag
+def stylesheet_urls(name):
+    return assets.stylesheet_urls(name)
+
+
+@register.simple_tag(takes_context=True)
+def page_stylesheet_urls(context):
+    """The stylesheets for the current page, by its URL name."""
+    match = getattr(context.get("request"), "resolver_match", None)
+    return assets.stylesheet_urls(assets.page_bundle(match and match.url_name))
@@ -1,5 +1,8 @@
 from django import template
 
+from ..categories import get_category_tree
+from ..models import Listing
+
 register = template.Library()
 
 
@@ -10,3 +13,19 @@ def multiply(value, arg):
         return int(value) * int(arg)
     except (ValueError, TypeError):
         return value
+
+
+@register.filter
+def category_name(listing):
+    """The listing's category name, from the cached tree rather than a query."""
+    if listing.category_id is None:
+        return ""
+    if Listing.category.is_cached(listing):
+        return listing.category.name
+    return get_category_tree().name(listing.category_id)
+
+
+@register.filter
+def category_generation(listing):
+    """Vary a cached fragment showing ``listing``'s category on category edits."""
+    return get_category_tree().generation
@@ -0,0 +1,24 @@
+from django import template
+from django.urls import reverse
+
+from ..thumbnails import WIDTHS, url_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(listing, width, format="jpeg"):
+    """The URL of the listing image's thumbnail at ``width`` pixels."""
+    return reverse(
+        "thumbnail", args=[listing.pk, url_key(listing.image), width, format]
+    )
+
+
+@register.simple_tag
+def thumbnail_srcset(listing, format="jpeg", max_width=WIDTHS[-1]):
+    """A ``srcset`` of the listing image's thumbnails up to ``max_width``."""
+    return ", ".join(
+        f"{thumbnail_url(listing, width, format)} {width}w"
+        for width in WIDTHS
+        if width <= max_width
+    )
@@ -1 +1,1917 @@
-# Create your tests here.
+import asyncio
+import csv
+import gzip
+import json
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, router, transaction
+from django.db.models import Max
+from django.http import HttpResponse
+from django.template import engines
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from . import assets
+from .admin import make_active, make_inactive
+from .assets import minify_css
+from .bidding import place_bids
+from .cache import anonymous_page_cache
+from .categories import get_category_tree, invalidate_category_tree
+from .consumers import websocket_application
+from .db import retry_on_lock
+from .forms import ListingForm
+from .live import InProcessBroker
+from .metrics import TimedDjangoTemplates, registry
+from .middleware import ReplicaMiddleware, StaticFilesMiddleware
+from .models import Bid, Category, CategoryFacet, Comment, Listing, User, Watchlist
+from .pagination import NEXT, CursorPaginator, encode_cursor
+from .routers import STICKY_COOKIE
+from .scheduler import close_due_batch
+from .search import search_listings
+from .sessions import SessionStore
+from .thumbnails import (
+    WIDTHS,
+    HTTPFetcher,
+    LocalFileFetcher,
+    ThumbnailCache,
+    ThumbnailError,
+)
+
+
+def create_listing(user, **kwargs):
+    kwargs.setdefault("title", "Listing")
+    kwargs.setdefault("description", "Description")
+    kwargs.setdefault("starting_bid", Decimal("1.00"))
+    category = kwargs.setdefault("category", "Other")
+    if isinstance(category, str):
+        kwargs["category"] = category_named(category)
+    return Listing.objects.create(user=user, **kwargs)
+
+
+def category_named(name):
+    # TransactionTestCase flushes the categories the migration created.
+    return Category.objects.get_or_create(name=name)[0]
+
+
+class PlaceBidTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = create_listing(self.seller)
+
+    def test_higher_bid_is_accepted(self):
+        self.listing.place_bid(self.bidder, Decimal("5.00"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_bid, Decimal("5.00"))
+        self.assertEqual(self.listing.bids.count(), 1)
+
+    def test_lower_or_equal_bid_is_rejected(self):
+        self.listing.place_bid(self.bidder, Decimal("5.00"))
+        for amount in (Decimal("5.00"), Decimal("4.99")):
+            with self.assertRaises(ValidationError):
+                self.listing.place_bid(self.bidder, amount)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_bid, Decimal("5.00"))
+        self.assertEqual(self.listing.bids.count(), 1)
+
+    def test_stale_instance_cannot_overwrite_higher_bid(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        self.listing.place_bid(self.bidder, Decimal("10.00"))
+        with self.assertRaises(ValidationError):
+            stale.place_bid(self.bidder, Decimal("7.00"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.current_bid, Decimal("10.00"))
+
+
+class ConcurrentBidTests(TransactionTestCase):
+    THREADS = 16
+    BIDS = 2000
+
+    def test_parallel_bids_keep_current_bid_at_max(self):
+        seller = User.objects.create_user("seller")
+        bidders = [User.objects.create_user(f"bidder{i}") for i in range(self.THREADS)]
+        listing = create_listing(seller)
+        amounts = [
+            Decimal(random.randint(100, 1000000)) / 100 for _ in range(self.BIDS)
+        ]
+        barrier = threading.Barrier(self.THREADS)
+        accepted = []
+
+        def worker(index):
+            instance = Listing.objects.get(pk=listing.pk)
+            barrier.wait()
+            try:
+                for amount in amounts[index :: self.THREADS]:
+                    try:
+                        instance.place_bid(bidders[index], amount)
+                        accepted.append(amount)
+                    except ValidationError:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        listing.refresh_from_db()
+        top = Bid.objects.filter(listing=listing).aggregate(top=Max("amount"))["top"]
+        self.assertEqual(listing.current_bid, top)
+        self.assertEqual(listing.current_bid, max(amounts))
+        history = list(
+            Bid.objects.filter(listing=listing)
+            .order_by("id")
+            .values_list("amount", flat=True)
+        )
+        self.assertEqual(len(history), len(accepted))
+        self.assertEqual(history, sorted(set(history)))
+
+
+class BidStatsTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        self.listing = create_listing(self.seller)
+
+    def test_place_bid_maintains_count_and_top_bidder(self):
+        self.listing.place_bid(self.alice, Decimal("5.00"))
+        self.listing.place_bid(self.bob, Decimal("6.00"))
+        with self.assertRaises(ValidationError):
+            self.listing.place_bid(self.alice, Decimal("5.50"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.top_bid_user, self.bob)
+
+    def test_close_and_detail_do_not_scan_bids(self):
+        self.listing.place_bid(self.alice, Decimal("5.00"))
+        self.client.force_login(self.seller)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse("close_auction", args=[self.listing.pk]))
+            response = self.client.get(reverse("listing", args=[self.listing.pk]))
+        self.assertContains(response, "1 bid")
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "auctions_bid" in q["sql"]]
+        )
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.winner, self.alice)
+
+    def test_close_picks_the_top_bidder_at_close_time(self):
+        self.listing.place_bid(self.alice, Decimal("5.00"))
+        # The view read the listing before Bob's bid was accepted.
+        stale = Listing.objects.get(pk=self.listing.pk)
+        self.listing.place_bid(self.bob, Decimal("6.00"))
+        self.client.force_login(self.seller)
+        url = reverse("close_auction", args=[self.listing.pk])
+        with mock.patch("auctions.views.get_object_or_404", return_value=stale):
+            self.client.post(url)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.winner, self.bob)
+        self.assertFalse(self.listing.active)
+
+        response = self.client.post(url, follow=True)
+        self.assertContains(response, "This auction is already closed.")
+        self.assertFalse(CategoryFacet.objects.filter(count__lt=0).exists())
+
+    def test_reconcile_command_fixes_drift(self):
+        self.listing.place_bid(self.alice, Decimal("5.00"))
+        self.listing.place_bid(self.bob, Decimal("6.00"))
+        untouched = create_listing(self.seller, title="Untouched")
+        Listing.objects.filter(pk=self.listing.pk).update(
+            bid_count=0, top_bid_user=None, current_bid=Decimal("500.00")
+        )
+        version = Listing.objects.get(pk=self.listing.pk).version
+        out = StringIO()
+        with mock.patch(
+            "auctions.management.commands.reconcile_bid_stats.purge_page_cache"
+        ) as purge:
+            call_command("reconcile_bid_stats", stdout=out)
+        self.assertIn("1 listing(s) out of sync", out.getvalue())
+        purge.assert_called_once()
+        self.listing.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.top_bid_user, self.bob)
+        self.assertEqual(self.listing.current_bid, Decimal("6.00"))
+        self.assertEqual(self.listing.version, version + 1)
+        self.assertEqual(untouched.bid_count, 0)
+        self.assertIsNone(untouched.top_bid_user)
+
+
+class QueryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("user")
+        for i in range(20):
+            listing = create_listing(
+                cls.user, title=f"Listing {i}", category="Books", active=i % 2 == 0
+            )
+            Watchlist.objects.create(user=cls.user, listing=listing, active=True)
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor == "postgresql":
+            # Tiny test tables would otherwise always be sequentially scanned.
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+            self.assertRegex(plan, r"Index (Only )?Scan|Bitmap Index Scan")
+        else:
+            plan = queryset.explain()
+            self.assertRegex(plan, r"USING (COVERING )?INDEX")
+        return plan
+
+    def test_active_listings_feed(self):
+        plan = self.assertUsesIndex(
+            Listing.objects.filter(active=True).order_by("-created", "-id")
+        )
+        self.assertIn("listing_active_created_idx", plan)
+
+    def test_category_feed(self):
+        plan = self.assertUsesIndex(
+            Listing.objects.filter(category__name="Books", active=True).order_by(
+                "-created"
+            )
+        )
+        self.assertIn("listing_cat_active_created_idx", plan)
+
+    def test_title_lookup(self):
+        plan = self.assertUsesIndex(Listing.objects.filter(title="Listing 3"))
+        self.assertIn("listing_title_idx", plan)
+
+    def test_watchlist_lookups(self):
+        self.assertUsesIndex(Watchlist.objects.filter(user=self.user, listing__id=1))
+        self.assertUsesIndex(Watchlist.objects.filter(user=self.user, active=True))
+        self.assertUsesIndex(
+            Listing.objects.filter(
+                watchlist__user=self.user, watchlist__active=True
+            ).order_by("-created")
+        )
+
+    def test_due_auctions_lookup(self):
+        plan = self.assertUsesIndex(
+            Listing.objects.filter(active=True, ends_at__lte=timezone.now()).order_by(
+                "ends_at"
+            )
+        )
+        self.assertIn("listing_active_ends_at_idx", plan)
+
+    def test_top_bid_lookup(self):
+        listing = Listing.objects.first()
+        plan = self.assertUsesIndex(listing.bids.order_by("-amount")[:1])
+        self.assertIn("bid_listing_amount_idx", plan)
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("user")
+        created = timezone.now()
+        for i in range(25):
+            listing = create_listing(cls.user, title=f"Listing {i}")
+            # Every third listing shares a timestamp to exercise the id tie-break.
+            Listing.objects.filter(pk=listing.pk).update(
+                created=created - timedelta(minutes=i - i % 3)
+            )
+        cls.expected = list(
+            Listing.objects.order_by("-created", "-id").values_list("pk", flat=True)
+        )
+
+    def test_walks_forward_and_back_over_every_row(self):
+        paginator = CursorPaginator(Listing.objects.all(), 10)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        seen = [listing.pk for page in pages for listing in page]
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+        back = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_next())
+        self.assertTrue(back.has_previous())
+
+    def test_last_page_cursor(self):
+        paginator = CursorPaginator(Listing.objects.all(), 10)
+        last = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual([listing.pk for listing in last], self.expected[-10:])
+        self.assertFalse(last.has_next())
+        self.assertTrue(last.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = CursorPaginator(Listing.objects.all(), 10).get_page("not-a-cursor")
+        self.assertEqual([listing.pk for listing in page], self.expected[:10])
+
+    def test_next_cursor_without_boundary_returns_first_page(self):
+        forged = encode_cursor(NEXT)
+        page = CursorPaginator(Listing.objects.all(), 10).get_page(forged)
+        self.assertEqual([listing.pk for listing in page], self.expected[:10])
+        response = self.client.get(reverse("index"), {"cursor": forged})
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_pages_without_count_query(self):
+        first = self.client.get(reverse("index"))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                reverse("index"), {"cursor": first.context["listings"].next_cursor}
+            )
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT" in q["sql"]])
+        self.assertEqual(
+            [listing.pk for listing in response.context["listings"]],
+            self.expected[10:20],
+        )
+
+    def test_page_number_links_still_work(self):
+        response = self.client.get(reverse("index"), {"page": 2})
+        self.assertEqual(response.context["listings"].number, 2)
+        self.assertEqual(
+            [listing.pk for listing in response.context["listings"]],
+            self.expected[10:20],
+        )
+
+    def test_category_filter_is_kept_in_cursor_links(self):
+        response = self.client.get(reverse("categories"), {"category": "Other"})
+        self.assertContains(response, "category=Other&amp;cursor=")
+
+
+class WatchlistCountCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user")
+        self.listings = [
+            create_listing(self.user, title=f"Listing {i}") for i in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def watchlist_queries(self, ctx):
+        return [
+            q
+            for q in ctx.captured_queries
+            if "COUNT(*)" in q["sql"] and "auctions_watchlist" in q["sql"]
+        ]
+
+    def test_count_is_cached_across_page_views(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(10):
+                response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 0)
+        self.assertEqual(len(self.watchlist_queries(ctx)), 1)
+
+    def test_watchlist_views_invalidate_the_count(self):
+        self.client.get(reverse("index"))
+        self.client.post(reverse("watchlist", args=[self.listings[0].pk]))
+        self.client.post(reverse("watchlist", args=[self.listings[1].pk]))
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 2)
+
+        self.client.get(reverse("watchlist_remove", args=[self.listings[0].pk]))
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 1)
+
+    def test_admin_actions_invalidate_the_count(self):
+        for listing in self.listings:
+            Watchlist.objects.create(user=self.user, listing=listing, active=True)
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 3)
+
+        make_inactive(
+            site._registry[Watchlist], None, Watchlist.objects.filter(active=True)
+        )
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 0)
+
+
+@override_settings(SESSION_ENGINE="auctions.sessions")
+class ListingDetailQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.viewer = User.objects.create_user("viewer")
+        self.listing = create_listing(self.seller)
+        Watchlist.objects.create(user=self.viewer, listing=self.listing, active=True)
+
+    def add_comments(self, count):
+        start = User.objects.count()
+        authors = [User.objects.create_user(f"author{start + i}") for i in range(count)]
+        Comment.objects.bulk_create(
+            Comment(text="Nice", user=author, listing=self.listing)
+            for author in authors
+        )
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.client.force_login(self.viewer)
+        url = reverse("listing", args=[self.listing.pk])
+        self.client.get(url)  # warm the cached watchlist count
+        self.add_comments(2)
+        # User (the session is cached), listing with seller/winner, watch
+        # status, comments.
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self.add_comments(20)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["comments"]), 22)
+
+    def test_is_watched_reflects_active_watchlist_row(self):
+        self.client.force_login(self.viewer)
+        url = reverse("listing", args=[self.listing.pk])
+        self.assertContains(self.client.get(url), "In Watchlist")
+        Watchlist.objects.update(active=False)
+        self.assertNotContains(self.client.get(url), "In Watchlist")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user")
+        self.camera = create_listing(
+            self.user, title="Vintage camera", description="Film body, works."
+        )
+        self.lens = create_listing(
+            self.user, title="Zoom lens", description="Fits any vintage camera."
+        )
+        self.closed = create_listing(
+            self.user, title="Camera bag", description="Leather.", active=False
+        )
+
+    def titles(self, terms):
+        return [listing.title for listing in search_listings(terms)[:10]]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.titles("camera"), ["Vintage camera", "Zoom lens"])
+        self.assertEqual(search_listings("camera").count(), 2)
+
+    def test_saved_and_deleted_listings_are_reindexed(self):
+        self.lens.title = "Telephoto lens"
+        self.lens.description = "Long reach."
+        self.lens.save()
+        self.assertEqual(self.titles("camera"), ["Vintage camera"])
+        self.assertEqual(self.titles("telephoto"), ["Telephoto lens"])
+        self.camera.delete()
+        self.assertEqual(self.titles("camera"), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.titles('camera" lens ('), ["Zoom lens"])
+        self.assertEqual(self.titles("***"), [])
+
+    def test_search_view_paginates_with_cards(self):
+        for i in range(12):
+            create_listing(self.user, title=f"Camera {i}")
+        response = self.client.get(reverse("search"), {"q": "camera"})
+        self.assertEqual(len(response.context["listings"]), 10)
+        self.assertEqual(response.context["listings"].paginator.count, 14)
+        self.assertContains(response, "auction-card")
+        self.assertContains(response, "q=camera&amp;page=2")
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0)
+class ListingCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = create_listing(self.seller, title="Lamp")
+
+    def test_cards_are_served_from_cache_until_version_changes(self):
+        self.assertContains(self.client.get(reverse("index")), "Lamp")
+        # Content changed behind the version's back is not re-rendered...
+        Listing.objects.filter(pk=self.listing.pk).update(title="Renamed")
+        self.assertContains(self.client.get(reverse("index")), "Lamp")
+        # ...but a bid bumps the version and the card renders again.
+        self.listing.place_bid(self.bidder, Decimal("42.00"))
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Renamed")
+        self.assertContains(response, "$42.00")
+
+    def test_writes_bump_the_version(self):
+        version = self.listing.version
+        self.listing.place_bid(self.bidder, Decimal("5.00"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.version, version + 1)
+
+        self.listing.image = "https://example.com/new.jpg"
+        self.listing.save()
+        self.assertEqual(self.listing.version, version + 2)
+
+        self.client.force_login(self.seller)
+        self.client.post(reverse("close_auction", args=[self.listing.pk]))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.version, version + 3)
+
+        make_active(site._registry[Listing], None, Listing.objects.all())
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.version, version + 4)
+
+
+class CategoryFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+
+    def facets(self):
+        return {
+            (facet.category.name, facet.price_range): facet.count
+            for facet in CategoryFacet.objects.exclude(count=0).select_related(
+                "category"
+            )
+        }
+
+    def assertFacetsMatchListings(self):
+        tally = CategoryFacet.objects.tally(Listing.objects.all())
+        self.assertEqual(
+            self.facets(),
+            {
+                (Category.objects.get(pk=category_id).name, index): count
+                for (category_id, index), count in tally.items()
+            },
+        )
+
+    def test_counters_follow_listing_changes(self):
+        lamp = create_listing(self.seller, title="Lamp", category="Home")
+        chair = create_listing(
+            self.seller, title="Chair", category="Home", starting_bid=Decimal(30)
+        )
+        create_listing(self.seller, title="Doll", category="Toys")
+        self.assertEqual(
+            self.facets(), {("Home", 0): 1, ("Home", 1): 1, ("Toys", 0): 1}
+        )
+
+        lamp.place_bid(self.bidder, Decimal("20.00"))
+        lamp.place_bid(self.bidder, Decimal("150.00"))
+        place_bids(self.bidder, [{"listing": chair.pk, "amount": "600"}])
+        self.assertEqual(
+            self.facets(), {("Home", 2): 1, ("Home", 3): 1, ("Toys", 0): 1}
+        )
+
+        self.client.force_login(self.seller)
+        self.client.post(reverse("close_auction", args=[lamp.pk]))
+        self.assertFacetsMatchListings()
+        make_inactive(site._registry[Listing], None, Listing.objects.all())
+        self.assertEqual(self.facets(), {})
+        make_active(site._registry[Listing], None, Listing.objects.all())
+        self.assertFacetsMatchListings()
+        Listing.objects.filter(pk=chair.pk).update(ends_at=timezone.now())
+        close_due_batch()
+        self.assertFacetsMatchListings()
+        Listing.objects.get(title="Doll").delete()
+        self.assertFacetsMatchListings()
+
+        lamp.category = category_named("Books")
+        lamp.save()
+        self.assertEqual(self.facets(), {("Books", 2): 1})
+
+    def test_saves_only_adjust_the_counters_they_change(self):
+        lamp = Listing.objects.get(pk=create_listing(self.seller, category="Home").pk)
+        lamp.title = "Desk lamp"
+        with CaptureQueriesContext(connection) as queries:
+            lamp.save(update_fields=["title"])
+            lamp.save()
+        self.assertFalse(
+            [q for q in queries if re.search("categoryfacet|SELECT", q["sql"])]
+        )
+        self.assertEqual(self.facets(), {("Home", 0): 1})
+
+        lamp.starting_bid = Decimal(30)
+        lamp.save(update_fields=["starting_bid"])
+        self.assertEqual(self.facets(), {("Home", 1): 1})
+        lamp.active = False
+        lamp.save(update_fields=["active"])
+        self.assertEqual(self.facets(), {})
+        self.assertEqual(lamp.version, 4)
+
+    def test_sidebar_and_price_filter(self):
+        create_listing(self.seller, title="Lamp", category="Home")
+        create_listing(
+            self.seller, title="Sofa", category="Home", starting_bid=Decimal(700)
+        )
+        create_listing(self.seller, title="Doll", category="Toys")
+
+        get_category_tree()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("categories"))
+        self.assertIn(("Home", 2), response.context["category_facets"])
+        self.assertIn(("Toys", 1), response.context["category_facets"])
+        self.assertEqual(
+            [count for _, _, count in response.context["price_facets"]],
+            [2, 0, 0, 1, 0],
+        )
+
+        response = self.client.get(
+            reverse("categories"), {"category": "Home", "price": "3"}
+        )
+        self.assertEqual(
+            [listing.title for listing in response.context["listings"]], ["Sofa"]
+        )
+        self.assertEqual(
+            [count for _, _, count in response.context["price_facets"]],
+            [1, 0, 0, 1, 0],
+        )
+        self.assertEqual(response.context["price_facets"][3][1], "$500 - $1,000")
+
+        # Digits int() rejects are no price filter, like any bad value.
+        response = self.client.get(reverse("categories"), {"price": "²"})
+        self.assertEqual(len(response.context["listings"]), 3)
+
+    def test_reconcile_fixes_drift(self):
+        create_listing(self.seller, title="Lamp", category="Home")
+        Listing.objects.bulk_create(
+            [
+                Listing(
+                    user=self.seller,
+                    title="Doll",
+                    category=category_named("Toys"),
+                    starting_bid=5,
+                )
+            ]
+        )
+        CategoryFacet.objects.filter(category__name="Home", price_range=0).update(
+            count=7
+        )
+        out = StringIO()
+        call_command("reconcile_category_facets", stdout=out)
+        self.assertIn("Reconciled 2 facet(s).", out.getvalue())
+        self.assertEqual(self.facets(), {("Home", 0): 1, ("Toys", 0): 1})
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(invalidate_category_tree)
+        self.seller = User.objects.create_user("seller")
+        self.home = Category.objects.get(name="Home")
+        self.lighting = Category.objects.create(name="Lighting", parent=self.home)
+        self.lamps = Category.objects.create(name="Lamps", parent=self.lighting)
+
+    def test_migration_created_the_former_choices(self):
+        self.assertEqual(
+            [category.name for category in get_category_tree().roots],
+            ["Fashion", "Toys", "Electronics", "Home", "Books", "Other"],
+        )
+
+    def test_descendants_and_choices(self):
+        tree = get_category_tree()
+        self.assertEqual(
+            tree.subtree_ids(self.home), {self.home.pk, self.lighting.pk, self.lamps.pk}
+        )
+        self.assertEqual(tree.root_of(tree.get(self.lamps.pk)).name, "Home")
+        labels = [label for _, label in tree.choices()]
+        index = labels.index("Home")
+        self.assertEqual(labels[index : index + 3], ["Home", "— Lighting", "— — Lamps"])
+
+    def test_saving_a_category_reloads_the_tree(self):
+        self.assertIsNone(get_category_tree().get(999))
+        Category.objects.create(pk=999, name="Garden")
+        self.assertEqual(get_category_tree().name(999), "Garden")
+
+    def test_renaming_a_category_updates_cached_cards(self):
+        create_listing(self.seller, category=self.lamps)
+        self.client.force_login(self.seller)
+        self.assertContains(self.client.get(reverse("index")), "Lamps")
+        self.lamps.name = "Desk lamps"
+        self.lamps.save()
+        self.assertContains(self.client.get(reverse("index")), "Desk lamps")
+
+    def test_cycles_are_rejected(self):
+        self.home.parent = self.lamps
+        with self.assertRaises(ValidationError):
+            self.home.full_clean()
+
+    def test_form_choices_need_no_query(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            html = str(ListingForm()["category"])
+        self.assertIn("— — Lamps", html)
+
+    def test_parent_includes_subcategories(self):
+        create_listing(self.seller, title="Desk lamp", category=self.lamps)
+        create_listing(self.seller, title="Rug", category="Home")
+        create_listing(self.seller, title="Doll", category="Toys")
+
+        response = self.client.get(reverse("categories"), {"category": "Home"})
+        self.assertEqual(
+            {listing.title for listing in response.context["listings"]},
+            {"Desk lamp", "Rug"},
+        )
+        self.assertIn(("Home", 2), response.context["category_facets"])
+        self.assertEqual(response.context["subcategory_facets"], [("Lighting", 1)])
+
+        response = self.client.get(reverse("categories"), {"category": "Lamps"})
+        self.assertEqual(
+            [listing.title for listing in response.context["listings"]],
+            ["Desk lamp"],
+        )
+        self.assertEqual(response.context["selected_root"], "Home")
+        self.assertContains(response, "Lamps")
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=60)
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = create_listing(self.seller, title="Lamp", category="Home")
+
+    def test_hits_need_no_database(self):
+        self.client.get(reverse("index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "Lamp")
+        with self.assertNumQueries(0):
+            self.client.get(reverse("index"), {"utm_source": "ad"})
+
+    def test_keyed_by_category(self):
+        self.client.get(reverse("categories"), {"category": "Home"})
+        response = self.client.get(reverse("categories"), {"category": "Books"})
+        self.assertNotContains(response, "Lamp")
+
+    def test_purged_by_listing_bid_and_close_events(self):
+        self.client.get(reverse("index"))
+        create_listing(self.seller, title="Chair")
+        self.assertContains(self.client.get(reverse("index")), "Chair")
+
+        self.listing.place_bid(self.bidder, Decimal("99.00"))
+        self.assertContains(self.client.get(reverse("index")), "$99.00")
+
+        make_inactive(site._registry[Listing], None, Listing.objects.all())
+        self.assertNotContains(self.client.get(reverse("index")), "Chair")
+
+    def test_bypassed_for_authenticated_users(self):
+        self.client.get(reverse("index"))
+        self.client.force_login(self.bidder)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "bidder")
+
+    def test_bypassed_when_messages_are_pending(self):
+        calls = []
+
+        @anonymous_page_cache
+        def view(request):
+            calls.append(request)
+            return HttpResponse("ok")
+
+        def get(with_message):
+            request = RequestFactory().get("/cached/")
+            request.user = AnonymousUser()
+            request._messages = CookieStorage(request)
+            if with_message:
+                messages.info(request, "Queued")
+            return view(request)
+
+        get(with_message=False)
+        get(with_message=False)
+        self.assertEqual(len(calls), 1)
+        get(with_message=True)
+        self.assertEqual(len(calls), 2)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.bidder = User.objects.create_user("bidder")
+        cls.listing = create_listing(cls.seller, title="Lamp", category="Home")
+        Comment.objects.create(user=cls.bidder, listing=cls.listing, text="Nice")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_middleware_chain_is_async_capable(self):
+        # A single sync-only middleware would run every ASGI request through
+        # one shared thread.
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(import_string(path).async_capable, path)
+
+    async def test_read_views(self):
+        await self.async_client.aforce_login(self.bidder)
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, "Lamp")
+        response = await self.async_client.get(
+            reverse("categories"), {"category": "Home"}
+        )
+        self.assertContains(response, "Lamp")
+        response = await self.async_client.get(reverse("index"), {"page": "1"})
+        self.assertContains(response, "Lamp")
+
+        response = await self.async_client.get(
+            reverse("listing", args=[self.listing.pk])
+        )
+        self.assertContains(response, "Nice")
+        self.assertFalse(response.context["is_watched"])
+        self.assertEqual(response.context["watchlist_count"], 0)
+
+        response = await self.async_client.get(
+            reverse("listing", args=[self.listing.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_watchlist(self):
+        await self.async_client.aforce_login(self.bidder)
+        url = reverse("watchlist", args=[self.listing.pk])
+        await self.async_client.get(reverse("index"))
+        response = await self.async_client.post(url)
+        self.assertEqual(response.status_code, 302)
+
+        response = await self.async_client.get(url)
+        self.assertContains(response, "Lamp")
+        self.assertEqual(response.context["watchlist_count"], 1)
+        response = await self.async_client.get(
+            reverse("listing", args=[self.listing.pk])
+        )
+        self.assertTrue(response.context["is_watched"])
+
+    async def test_anonymous_page_cache(self):
+        await self.async_client.get(reverse("index"))
+        await Listing.objects.filter(pk=self.listing.pk).aupdate(title="Changed")
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, "Lamp")
+
+
+class ListingApiTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = create_listing(self.seller, title="Lamp", category="Home")
+
+    def test_listings(self):
+        create_listing(self.seller, title="Book", category="Books")
+        create_listing(self.seller, title="Closed", active=False)
+        response = self.client.get(reverse("api_listings"))
+        titles = [row["title"] for row in response.json()["results"]]
+        self.assertEqual(titles, ["Book", "Lamp"])
+        self.assertEqual(response.json()["results"][1]["starting_bid"], "1.00")
+
+        response = self.client.get(reverse("api_listings"), {"category": "Home"})
+        self.assertEqual([row["title"] for row in response.json()["results"]], ["Lamp"])
+
+    def test_listings_pagination(self):
+        for i in range(55):
+            create_listing(self.seller, title=f"Listing {i}")
+        first = self.client.get(reverse("api_listings")).json()
+        self.assertEqual(len(first["results"]), 50)
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(second["results"]), 6)
+        self.assertIsNone(second["next"])
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(len(set(ids)), 56)
+
+    def test_listing_and_bids(self):
+        self.listing.place_bid(self.bidder, Decimal("5.00"))
+        self.listing.place_bid(self.bidder, Decimal("7.00"))
+        data = self.client.get(reverse("api_listing", args=[self.listing.pk])).json()
+        self.assertEqual(data["seller"], "seller")
+        self.assertEqual(data["current_bid"], "7.00")
+        self.assertEqual(data["bid_count"], 2)
+        self.assertIsNone(data["winner"])
+
+        data = self.client.get(
+            reverse("api_listing_bids", args=[self.listing.pk])
+        ).json()
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(
+            [(bid["amount"], bid["bidder"]) for bid in data["results"]],
+            [("7.00", "bidder"), ("5.00", "bidder")],
+        )
+
+        for name in ("api_listing", "api_listing_bids"):
+            response = self.client.get(reverse(name, args=[self.listing.pk + 100]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        url = reverse("api_listing", args=[self.listing.pk])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        # Only the version lookup runs, not the serializing query.
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, headers={"if-modified-since": response["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.listing.place_bid(self.bidder, Decimal("5.00"))
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_conditional_list(self):
+        url = reverse("api_listings")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        # Revalidating reads the index on "updated", without counting rows.
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT", queries[0]["sql"])
+        response = self.client.get(
+            url, {"category": "Home"}, headers={"if-none-match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.listing.ends_at = timezone.now() - timedelta(minutes=1)
+        self.listing.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(close_due_batch(), 1)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [])
+
+    def test_deleting_a_listing_changes_the_list_etag(self):
+        create_listing(self.seller, title="Book")
+        url = reverse("api_listings")
+        etag = self.client.get(url)["ETag"]
+        # Not the most recently updated listing, so the maximum stays.
+        self.listing.delete()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["title"] for row in response.json()["results"]], ["Book"])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.staff = User.objects.create_user("staff", is_staff=True)
+        self.listing = create_listing(self.staff, title="Lamp")
+
+    def sample(self, text, name, view):
+        prefix = f'{name}{{view="{view}"}} '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix) :])
+        self.fail(f"{prefix} not found")
+
+    def scrape(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.client.logout()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_records_views(self):
+        for _ in range(3):
+            self.client.get(reverse("index"))
+        self.client.get(reverse("listing", args=[self.listing.pk]))
+        self.client.get("/no-such-page/")
+        text = self.scrape()
+
+        self.assertEqual(
+            self.sample(text, "auctions_request_duration_seconds_count", "index"), 3
+        )
+        self.assertIn(
+            'auctions_request_duration_seconds_bucket{view="index",le="+Inf"} 3',
+            text,
+        )
+        # listing is async: its queries run in another thread.
+        self.assertGreater(self.sample(text, "auctions_db_queries_total", "listing"), 0)
+        self.assertGreater(
+            self.sample(text, "auctions_template_render_seconds_total", "index"), 0
+        )
+        self.assertIn('view="<unmatched>"', text)
+        self.assertIn(
+            'auctions_recent_request_duration_seconds{view="index",quantile="0.99"}',
+            text,
+        )
+
+    def test_timed_engine_keeps_the_django_alias(self):
+        self.assertIsInstance(engines["django"], TimedDjangoTemplates)
+
+    def test_query_count_per_request(self):
+        get_category_tree()  # Kept per process; not part of the request.
+        self.client.get(reverse("api_listing", args=[self.listing.pk]))
+        text = self.scrape()
+        # The ETag lookup and the serializing query.
+        self.assertEqual(
+            self.sample(text, "auctions_db_queries_total", "api_listing"), 2
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_staff_or_token_only(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, headers={"authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, headers={"authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+
+
+class ImportAuctionsTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.seller = User.objects.create_user("seller")
+        create_listing(self.seller, title="Taken")
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def run_import(self, **paths):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_auctions",
+            *[f"--{kind}={path}" for kind, path in paths.items()],
+            "--password-hasher=django.contrib.auth.hashers.MD5PasswordHasher",
+            stdout=out,
+            stderr=err,
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_and_validates(self):
+        users = self.write(
+            "users.csv",
+            "username,email,password\n"
+            "alice,alice@example.com,secret\n"
+            "bob,,secret\n"
+            "bob,,dup\n"
+            "seller,,taken\n",
+        )
+        listings = self.write(
+            "listings.jsonl",
+            "\n".join(
+                json.dumps(row)
+                for row in [
+                    {
+                        "title": "Guitar",
+                        "description": "Six strings",
+                        "starting_bid": "10.00",
+                        "category": "Other",
+                        "user": "alice",
+                        "ends_at": "2030-01-01T12:00:00",
+                    },
+                    {"title": "Taken", "description": "x", "starting_bid": 1},
+                    {"title": "Nobody", "description": "x", "starting_bid": 1},
+                    {"title": "Cheap", "description": "x", "starting_bid": "-1"},
+                ]
+            )
+            + "\nnot json\n",
+        )
+        bids = self.write(
+            "bids.csv",
+            "listing,user,amount\n"
+            "Guitar,bob,12\n"
+            "Guitar,seller,15.50\n"
+            "Guitar,bob,abc\n"
+            "Missing,bob,20\n",
+        )
+        comments = self.write(
+            "comments.csv", "listing,user,text\nGuitar,alice,Great sound\n"
+        )
+
+        out, err = self.run_import(
+            users=users, listings=listings, bids=bids, comments=comments
+        )
+        self.assertIn("Imported 2 users, skipped 2.", out)
+        self.assertIn("Imported 1 listings, skipped 4.", out)
+        self.assertIn("Imported 2 bids, skipped 2.", out)
+        self.assertIn("Imported 1 comments.", out)
+        self.assertIn("line 4: Duplicate username in the input.", err)
+        self.assertIn("line 5: User 'seller' already exists.", err)
+        self.assertIn("line 2: Title 'Taken' is already taken.", err)
+        self.assertIn("Unknown user ''", err)
+        self.assertIn("line 5: Not a valid row.", err)
+        self.assertIn("line 5: Unknown listing 'Missing'.", err)
+
+        alice = User.objects.get(username="alice")
+        bob = User.objects.get(username="bob")
+        self.assertTrue(alice.password.startswith("md5$"))
+        self.assertEqual(alice.password, bob.password)
+        guitar = Listing.objects.get(title="Guitar")
+        self.assertEqual(guitar.user, alice)
+        self.assertEqual(guitar.ends_at.year, 2030)
+        self.assertEqual(guitar.current_bid, Decimal("15.50"))
+        self.assertEqual(guitar.bid_count, 2)
+        self.assertEqual(guitar.top_bid_user, self.seller)
+        self.assertEqual(guitar.comments.get().text, "Great sound")
+        self.assertEqual(
+            [listing.pk for listing in search_listings("guitar")[:5]], [guitar.pk]
+        )
+
+    def test_queries_per_chunk(self):
+        User.objects.create_user("alice")
+        rows = "".join(f"Listing {i},Description,1.00,Other,alice\n" for i in range(50))
+        path = self.write(
+            "listings.csv", "title,description,starting_bid,category,user\n" + rows
+        )
+        # Per chunk: savepoint, one title query, one seller query, the insert,
+        # one facet update, two executemany calls for the search index, and
+        # the release.
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "import_auctions",
+                f"--listings={path}",
+                "--batch-size=25",
+                stdout=StringIO(),
+            )
+        self.assertEqual(len(queries), 2 * 8)
+        self.assertEqual(
+            Listing.objects.filter(title__startswith="Listing ").count(), 50
+        )
+
+    def test_requires_a_file(self):
+        with self.assertRaises(CommandError):
+            call_command("import_auctions")
+
+
+class ExportAuctionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user("seller")
+        cls.bidder = User.objects.create_user("bidder")
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.listings = [create_listing(cls.seller, title=f"Item {i}") for i in range(5)]
+        for listing in cls.listings:
+            listing.place_bid(cls.bidder, Decimal("10.00"))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, kind, filename, *args):
+        path = os.path.join(self.directory, filename)
+        out = StringIO()
+        call_command("export_auctions", kind, path, *args, stdout=out)
+        return path, out.getvalue()
+
+    def test_exports_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            path, out = self.export("listings", "listings.csv", "--chunk-size=2")
+        # Two full chunks and the short one that ends the export.
+        self.assertEqual(len(queries), 3)
+        self.assertIn("Exported 5 listings.", out)
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(
+            [int(row["id"]) for row in rows], [listing.pk for listing in self.listings]
+        )
+        self.assertEqual(rows[0]["current_bid"], "10.00")
+        self.assertEqual(rows[0]["top_bidder"], "bidder")
+        self.assertEqual(rows[0]["winner"], "")
+
+    def test_incremental_gzipped_export(self):
+        old = timezone.now() - timedelta(days=2)
+        Bid.objects.filter(listing__in=self.listings[:3]).update(created=old)
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        path, out = self.export("bids", "bids.jsonl.gz", f"--since={since}")
+        self.assertIn("Exported 2 bids.", out)
+        with gzip.open(path, "rt") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row["listing"] for row in rows], ["Item 3", "Item 4"])
+        self.assertEqual(rows[0]["amount"], "10.00")
+
+        with self.assertRaises(CommandError):
+            self.export("bids", "bids.csv", "--since=yesterday")
+
+    async def test_streaming_view(self):
+        url = reverse("export", args=["listings"])
+        await self.async_client.aforce_login(self.bidder)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(url, {"format": "jsonl", "gzip": "1"})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('filename="listings.jsonl.gz"', response["Content-Disposition"])
+        content = b"".join([part async for part in response.streaming_content])
+        rows = [json.loads(line) for line in gzip.decompress(content).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["user"], "seller")
+
+        response = await self.async_client.get(url, {"since": "soon"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse("export", args=["users"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class LiveUpdatesTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.listing = create_listing(self.seller)
+
+    def place_bid(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.place_bid(self.bidder, amount)
+
+    async def connect(self, path):
+        incoming = asyncio.Queue()
+        outgoing = asyncio.Queue()
+        await incoming.put({"type": "websocket.connect"})
+        scope = {"type": "websocket", "path": path}
+        task = asyncio.ensure_future(
+            websocket_application(scope, incoming.get, outgoing.put)
+        )
+        return task, incoming, outgoing
+
+    async def test_subscribers_receive_bid_events(self):
+        task, incoming, outgoing = await self.connect(f"/ws/listing/{self.listing.pk}/")
+        self.assertEqual((await outgoing.get())["type"], "websocket.accept")
+
+        await sync_to_async(self.place_bid)(Decimal("12.50"))
+        message = await asyncio.wait_for(outgoing.get(), timeout=1)
+        self.assertEqual(
+            json.loads(message["text"]),
+            {"type": "bid", "current_bid": "12.50", "bid_count": 1, "bidder": "bidder"},
+        )
+
+        await incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(task, timeout=1)
+
+    async def test_unknown_listing_is_rejected(self):
+        task, _, outgoing = await self.connect("/ws/listing/999999/")
+        await asyncio.wait_for(task, timeout=1)
+        self.assertEqual((await outgoing.get())["type"], "websocket.close")
+
+    def test_close_publishes_winner(self):
+        self.place_bid(Decimal("3.00"))
+        self.client.force_login(self.seller)
+        with mock.patch(
+            "auctions.live.get_broker"
+        ) as get_broker, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("close_auction", args=[self.listing.pk]))
+        get_broker.return_value.publish.assert_called_once_with(
+            f"listing.{self.listing.pk}", {"type": "closed", "winner": "bidder"}
+        )
+
+    async def test_broker_forgets_unsubscribed_queues(self):
+        broker = InProcessBroker()
+        queue = broker.subscribe("listing.1")
+        broker.publish("listing.1", {"n": 1})
+        self.assertEqual(await asyncio.wait_for(queue.get(), timeout=1), {"n": 1})
+        broker.unsubscribe("listing.1", queue)
+        broker.publish("listing.1", {"n": 2})
+        await asyncio.sleep(0)
+        self.assertTrue(queue.empty())
+
+
+class AuctionSchedulerTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.now = timezone.now()
+
+    def test_closes_due_auctions_with_their_top_bidder(self):
+        due = create_listing(self.seller, title="Due", ends_at=self.now + timedelta(1))
+        due.place_bid(self.bidder, Decimal("5.00"))
+        Listing.objects.filter(pk=due.pk).update(ends_at=self.now - timedelta(1))
+        unbid = create_listing(
+            self.seller, title="Unbid", ends_at=self.now - timedelta(1)
+        )
+        future = create_listing(
+            self.seller, title="Future", ends_at=self.now + timedelta(1)
+        )
+        open_ended = create_listing(self.seller, title="Open")
+
+        out = StringIO()
+        call_command("close_auctions", stdout=out)
+        self.assertIn("Closed 2 auction(s)", out.getvalue())
+
+        due.refresh_from_db()
+        unbid.refresh_from_db()
+        self.assertFalse(due.active)
+        self.assertEqual(due.winner, self.bidder)
+        self.assertFalse(unbid.active)
+        self.assertIsNone(unbid.winner)
+        self.assertTrue(Listing.objects.get(pk=future.pk).active)
+        self.assertTrue(Listing.objects.get(pk=open_ended.pk).active)
+
+    def test_batch_cost_does_not_grow_with_batch_size(self):
+        Listing.objects.bulk_create(
+            Listing(
+                user=self.seller,
+                title=f"Listing {i}",
+                starting_bid=Decimal("1.00"),
+                category=category_named("Other"),
+                ends_at=self.now - timedelta(minutes=i),
+                top_bid_user=self.bidder,
+            )
+            for i in range(50)
+        )
+        # Savepoint, due ids, set-based close between two grouped facet
+        # counts, one facet update, winners for live events.
+        with self.assertNumQueries(8):
+            self.assertEqual(close_due_batch(batch_size=40, now=self.now), 40)
+        self.assertEqual(close_due_batch(batch_size=40, now=self.now), 10)
+        self.assertEqual(close_due_batch(batch_size=40, now=self.now), 0)
+        self.assertEqual(Listing.objects.filter(winner=self.bidder).count(), 50)
+
+    def test_worker_needs_a_shared_broker_and_cache(self):
+        shared_broker = mock.patch(
+            "auctions.scheduler.get_broker", return_value=mock.Mock(shared=True)
+        )
+        shared_cache = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        )
+        with mock.patch("auctions.scheduler.run") as run:
+            with self.assertRaisesMessage(CommandError, "InProcessBroker"):
+                call_command("close_auctions", "--loop")
+            with shared_broker, self.assertRaisesMessage(CommandError, "local"):
+                call_command("close_auctions", "--loop")
+            run.assert_not_called()
+            with shared_broker, shared_cache:
+                call_command("close_auctions", "--loop")
+            run.assert_called_once()
+
+    def test_bids_after_the_end_are_rejected(self):
+        listing = create_listing(self.seller, ends_at=self.now - timedelta(1))
+        with self.assertRaisesMessage(ValidationError, "This auction has ended."):
+            listing.place_bid(self.bidder, Decimal("5.00"))
+        self.assertEqual(listing.bids.count(), 0)
+
+    def test_is_ending_soon(self):
+        self.assertTrue(
+            create_listing(
+                self.seller, ends_at=self.now + timedelta(hours=2)
+            ).is_ending_soon
+        )
+        self.assertFalse(
+            create_listing(
+                self.seller, ends_at=self.now + timedelta(days=3)
+            ).is_ending_soon
+        )
+        self.assertFalse(create_listing(self.seller).is_ending_soon)
+
+
+@override_settings(SESSION_ENGINE="auctions.sessions")
+class BulkBidTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user("seller")
+        self.bidder = User.objects.create_user("bidder")
+        self.lamp = create_listing(self.seller, title="Lamp")
+        self.chair = create_listing(self.seller, title="Chair")
+        self.closed = create_listing(self.seller, title="Closed", active=False)
+        self.lamp.place_bid(self.seller, Decimal("10.00"))
+        self.client.force_login(self.bidder)
+
+    def post(self, bids):
+        return self.client.post(
+            reverse("bulk_bids"), json.dumps(bids), content_type="application/json"
+        )
+
+    def test_applies_accepted_bids_and_reports_each_result(self):
+        response = self.post(
+            [
+                {"listing": self.lamp.pk, "amount": "9.00"},
+                {"listing": self.lamp.pk, "amount": "11.00"},
+                {"listing": self.chair.pk, "amount": 3},
+                {"listing": self.lamp.pk, "amount": "10.50"},
+                {"listing": self.lamp.pk, "amount": "12.00"},
+                {"listing": self.closed.pk, "amount": "5.00"},
+                {"listing": 999999, "amount": "5.00"},
+                {"listing": self.chair.pk, "amount": "-1"},
+                {"listing": self.chair.pk, "amount": "1.001"},
+                "nonsense",
+            ]
+        )
+        body = response.json()
+        self.assertEqual(body["accepted"], 3)
+        self.assertEqual(body["rejected"], 7)
+        self.assertEqual(
+            [result["status"] for result in body["results"]],
+            ["rejected", "accepted", "accepted", "rejected", "accepted"]
+            + ["rejected"] * 5,
+        )
+        self.assertEqual(body["results"][5]["error"], "This auction has ended.")
+
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.current_bid, Decimal("12.00"))
+        self.assertEqual(self.lamp.bid_count, 3)
+        self.assertEqual(self.lamp.top_bid_user, self.bidder)
+        self.assertEqual(
+            list(self.lamp.bids.order_by("id").values_list("amount", flat=True)),
+            [Decimal("10.00"), Decimal("11.00"), Decimal("12.00")],
+        )
+        self.chair.refresh_from_db()
+        self.assertEqual(self.chair.current_bid, Decimal("3.00"))
+
+    def test_query_count_is_per_listing_not_per_bid(self):
+        bids = [
+            {"listing": listing.pk, "amount": str(amount)}
+            for amount in range(20, 120)
+            for listing in (self.lamp, self.chair)
+        ]
+        # User (the session is cached), savepoint, state, one UPDATE per
+        # listing and a previous price lookup as it leaves its price range,
+        # bulk insert, one UPDATE per facet changed, savepoint release.
+        with self.assertNumQueries(11):
+            response = self.post(bids)
+        self.assertEqual(response.json()["accepted"], 200)
+
+    def test_rejects_malformed_requests(self):
+        self.assertEqual(self.post({"listing": 1}).status_code, 400)
+        response = self.client.post(
+            reverse("bulk_bids"), "{", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post([]).status_code, 401)
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0)
+class StaticBundleTests(TestCase):
+    def test_minify_css(self):
+        css = """
+            /* Card */
+            .card :hover , .card > a {
+                content: "a  { b }";
+                margin : 0 auto;
+            }
+        """
+        self.assertEqual(
+            minify_css(css), '.card :hover,.card > a{content:"a  { b }";margin :0 auto}'
+        )
+
+    def test_minify_css_keeps_strings_and_urls(self):
+        css = """
+            a::after { content: ";}" ; }
+            b { background: url(data:image/svg+xml;utf8,x;}/*y*/) ; }
+        """
+        self.assertEqual(
+            minify_css(css),
+            'a::after{content:";}"}b{background:url(data:image/svg+xml;utf8,x;}/*y*/)}',
+        )
+
+    def test_sources_are_linked_until_collectstatic_has_run(self):
+        response = self.client.get(reverse("login"))
+        self.assertContains(response, "<style>:root{")
+        self.assertContains(response, "/static/css/components/card.css")
+        self.assertContains(response, "/static/css/auctions/login/styles.css")
+
+    def test_critical_css_is_minified_once_per_source_version(self):
+        with mock.patch.dict(assets._critical_css, clear=True), mock.patch(
+            "auctions.assets.build_bundle", wraps=assets.build_bundle
+        ) as build:
+            css = assets.critical_css()
+            self.assertEqual(assets.critical_css(), css)
+            path = finders.find(assets.CRITICAL_CSS[0])
+            mtime = os.stat(path).st_mtime_ns
+            self.addCleanup(os.utime, path, ns=(mtime, mtime))
+            os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+            assets.critical_css()
+        self.assertEqual(build.call_count, 2)
+
+    def test_collectstatic_writes_precompressed_bundles(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(
+            STATIC_ROOT=directory.name,
+            # Only the project's own files, to keep the test quick.
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            response = self.client.get(reverse("login"))
+            links = [
+                line.split('"')[1]
+                for line in response.content.decode().splitlines()
+                if '<link href="/static/' in line
+            ]
+            self.assertEqual(len(links), 3)  # Components twice, for noscript.
+            self.assertRegex(links[0], r"^/static/css/bundles/components\.\w{12}\.css$")
+            self.assertRegex(links[1], r"^/static/css/bundles/login\.\w{12}\.css$")
+            self.assertContains(response, "<style>:root{")
+
+            middleware = StaticFilesMiddleware(lambda request: HttpResponse())
+            request = RequestFactory().get(links[1], HTTP_ACCEPT_ENCODING="gzip")
+            response = middleware(request)
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertIn("immutable", response["Cache-Control"])
+            self.assertIn("max-age=315360000", response["Cache-Control"])
+            with gzip.open(response.file_to_stream) as f:
+                self.assertTrue(f.read().startswith(b".card{"))
+
+
+@override_settings(
+    ANONYMOUS_PAGE_CACHE_TIMEOUT=0,
+    THUMBNAIL_FETCHER="auctions.thumbnails.LocalFileFetcher",
+)
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = os.path.join(directory.name, "thumbnails")
+        images = os.path.join(directory.name, "images")
+        os.makedirs(os.path.join(images, "photos"))
+        Image.new("RGBA", (2000, 1000), (200, 40, 40, 128)).save(
+            os.path.join(images, "photos", "lamp.png")
+        )
+        settings = override_settings(
+            THUMBNAIL_ROOT=self.root, THUMBNAIL_LOCAL_ROOT=images
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.seller = User.objects.create_user("seller")
+        self.listing = create_listing(
+            self.seller, title="Lamp", image="https://example.com/photos/lamp.png"
+        )
+
+    def thumbnail_url(self, width, format, listing=None):
+        response = self.client.get(reverse("index"))
+        listing = listing or self.listing
+        match = re.search(
+            rf"/thumbnails/{listing.pk}/\w+/{width}\.{format}",
+            response.content.decode(),
+        )
+        self.assertIsNotNone(match, f"No {width}px {format} thumbnail linked.")
+        return match.group()
+
+    def test_cards_link_thumbnails_instead_of_the_image(self):
+        response = self.client.get(reverse("index"))
+        self.assertNotContains(response, 'src="https://example.com/photos/lamp.png"')
+        self.assertContains(response, " 640w")
+        self.assertNotContains(response, " 1280w")
+        response = self.client.get(reverse("listing", args=[self.listing.pk]))
+        self.assertContains(response, " 1280w")
+
+    def test_thumbnails_are_resized_and_cached(self):
+        webp = self.thumbnail_url(320, "webp")
+        jpeg = self.thumbnail_url(640, "jpeg")
+        with mock.patch.object(
+            LocalFileFetcher, "fetch", autospec=True, side_effect=LocalFileFetcher.fetch
+        ) as fetch:
+            response = self.client.get(webp)
+            self.client.get(jpeg)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual((image.format, image.size), ("WEBP", (320, 160)))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(jpeg)
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(
+            (image.format, image.mode, image.size), ("JPEG", "RGB", (640, 320))
+        )
+
+    def test_thumbnails_evicted_after_the_lookup_are_regenerated(self):
+        url = self.thumbnail_url(320, "webp")
+        self.client.get(url)
+        cached = ThumbnailCache.cached
+
+        def evicted(thumbnails, *args):
+            # Another worker's evict() runs between the lookup and the open.
+            path = cached(thumbnails, *args)
+            os.remove(path)
+            return path
+
+        with mock.patch.object(ThumbnailCache, "cached", evicted):
+            response = self.client.get(url)
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 160))
+
+    def test_thumbnails_evicted_as_they_are_written_are_made_again(self):
+        thumbnail = ThumbnailCache.thumbnail
+        paths = []
+
+        def evicted_once(thumbnails, *args):
+            path = thumbnail(thumbnails, *args)
+            if not paths:
+                os.remove(path)  # Evicted by another worker's write.
+            paths.append(path)
+            return path
+
+        with mock.patch.object(ThumbnailCache, "thumbnail", evicted_once):
+            response = self.client.get(self.thumbnail_url(320, "webp"))
+        self.assertEqual(len(paths), 2)
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 160))
+
+    def test_unknown_sizes_and_stale_keys_are_not_found(self):
+        url = self.thumbnail_url(320, "webp")
+        self.assertEqual(
+            self.client.get(url.replace("/320.", "/321.")).status_code, 404
+        )
+        self.assertEqual(self.client.get(url.replace(".webp", ".gif")).status_code, 404)
+        self.listing.image = "https://example.com/photos/other.png"
+        self.listing.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unusable_images_redirect_to_the_original(self):
+        listing = create_listing(
+            self.seller, title="Chair", image="https://example.com/photos/missing.png"
+        )
+        url = self.thumbnail_url(320, "webp", listing)
+        response = self.client.get(url)
+        self.assertRedirects(response, listing.image, fetch_redirect_response=False)
+        with mock.patch.object(LocalFileFetcher, "fetch") as fetch:
+            self.client.get(url)
+        fetch.assert_not_called()
+
+    def test_least_recently_used_files_are_evicted(self):
+        thumbnails = ThumbnailCache(self.root, max_bytes=10**9)
+        paths = [
+            thumbnails.thumbnail(self.listing.image, width, "jpeg", LocalFileFetcher())
+            for width in WIDTHS
+        ]
+        for age, path in enumerate(paths):
+            os.utime(path, (0, age))  # The smallest is the least recently used.
+
+        def total():
+            return sum(
+                os.path.getsize(os.path.join(directory, name))
+                for directory, _, names in os.walk(self.root)
+                for name in names
+            )
+
+        thumbnails.max_bytes = total() - 1
+        self.assertGreater(thumbnails.evict(), 0)
+        self.assertLessEqual(total(), thumbnails.max_bytes * 0.9)
+        kept = [path.exists() for path in paths]
+        self.assertFalse(kept[0])
+        self.assertEqual(kept, sorted(kept))  # Oldest first.
+
+    def test_http_fetcher_refuses_private_addresses(self):
+        for url in ("http://127.0.0.1/a.png", "http://10.0.0.1/a.png", "file:///etc"):
+            with self.assertRaises(ThumbnailError):
+                HTTPFetcher().fetch(url)
+
+    def test_http_fetcher_connects_to_the_address_it_checked(self):
+        def resolve_to(address):
+            def getaddrinfo(host, port, *args, **kwargs):
+                return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+
+            return mock.patch("socket.getaddrinfo", getaddrinfo)
+
+        for scheme, port in (("http", 80), ("https", 443)):
+            with self.subTest(scheme), resolve_to("93.184.215.14"), mock.patch(
+                "socket.create_connection", side_effect=OSError
+            ) as connect:
+                with self.assertRaises(ThumbnailError):
+                    HTTPFetcher().fetch(f"{scheme}://a.test/a.png")
+                connect.assert_called_once_with(("93.184.215.14", port), 10, None)
+
+        # Resolved when connecting, so a rebinding host is refused.
+        with resolve_to("127.0.0.1"), mock.patch("socket.create_connection") as connect:
+            with self.assertRaises(ThumbnailError):
+                HTTPFetcher().fetch("http://a.test/a.png")
+            connect.assert_not_called()
+
+
+@override_settings(
+    SESSION_ENGINE="auctions.sessions",
+    SESSION_WRITE_INTERVAL=60,
+    ANONYMOUS_PAGE_CACHE_TIMEOUT=0,
+)
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="password")
+        self.listing = create_listing(User.objects.create_user("seller"))
+
+    def session_queries(self, queries):
+        return [q["sql"] for q in queries if "django_session" in q["sql"]]
+
+    def test_signed_in_views_skip_the_session_table(self):
+        self.client.login(username="alice", password="password")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("index"))
+            response = self.client.post(
+                reverse("bid", args=[self.listing.pk]), {"amount": "5"}, follow=True
+            )
+        self.assertContains(response, "Your bid has been placed successfully.")
+        self.assertEqual(self.session_queries(queries), [])
+
+    def test_unchanged_sessions_are_not_written_again(self):
+        session = SessionStore()
+        session["a"] = [1]
+        session.save()
+
+        session = SessionStore(session.session_key)
+        session["a"] = [1]
+        with self.assertNumQueries(0):
+            session.save()
+        session["a"].append(2)
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertTrue(self.session_queries(queries))
+
+        session["a"] = [1, 2]
+        with mock.patch(
+            "auctions.sessions.time.time", return_value=1e10
+        ), CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertTrue(self.session_queries(queries))
+
+    def test_existing_database_sessions_carry_over(self):
+        from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+        old = DBStore()
+        old["a"] = 1
+        old.save()
+
+        self.assertEqual(SessionStore(old.session_key)["a"], 1)
+        cache.clear()
+        out = StringIO()
+        call_command("warm_session_cache", stdout=out)
+        self.assertIn("Cached 1 session(s).", out.getvalue())
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(old.session_key)["a"], 1)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_file_databases_use_wal_and_immediate_transactions(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        other = connection.copy()
+        other.settings_dict["NAME"] = os.path.join(directory.name, "db.sqlite3")
+        self.addCleanup(other.close)
+        with other.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+        self.assertEqual(other.transaction_mode, "IMMEDIATE")
+
+
+@mock.patch("auctions.db.time.sleep")
+class RetryOnLockTests(SimpleTestCase):
+    @mock.patch("auctions.db.random.uniform", return_value=1)
+    def test_transient_lock_errors_are_retried(self, uniform, sleep):
+        func = mock.Mock(
+            side_effect=[OperationalError("database is locked")] * 2 + ["done"]
+        )
+        self.assertEqual(retry_on_lock(func, 1, key=2), "done")
+        self.assertEqual(func.call_count, 3)
+        func.assert_called_with(1, key=2)
+        # Doubling from LOCK_BACKOFF, times the jitter factor.
+        self.assertEqual(sleep.call_args_list, [mock.call(0.05), mock.call(0.1)])
+        uniform.assert_called_with(0.5, 1.5)
+
+    def test_retries_are_bounded(self, sleep):
+        func = mock.Mock(side_effect=OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)
+        self.assertEqual(func.call_count, 4)
+
+    def test_other_errors_are_not_retried(self, sleep):
+        func = mock.Mock(side_effect=OperationalError("no such table: x"))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)
+        self.assertEqual(func.call_count, 1)
+
+    @mock.patch.object(connection, "in_atomic_block", True)
+    def test_not_retried_inside_an_outer_transaction(self, sleep):
+        func = mock.Mock(side_effect=OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            retry_on_lock(func)
+        self.assertEqual(func.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_STICKY_SECONDS=10)
+class ReadReplicaTests(SimpleTestCase):
+    def request(self, view, method="get", cookies=None):
+        """Run ``view`` through the middleware; return its reads and response."""
+        reads = []
+
+        def get_response(request):
+            view(lambda: reads.append(router.db_for_read(Listing)))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/")
+        request.COOKIES.update(cookies or {})
+        return reads, ReplicaMiddleware(get_response)(request)
+
+    def test_reads_go_to_replicas_within_requests(self):
+        reads, response = self.request(lambda read: read())
+        self.assertEqual(reads, ["replica1"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(Listing), "default")
+
+    def test_writes_pin_the_request_and_the_next_ones(self):
+        def view(read):
+            read()
+            router.db_for_write(Listing)
+            read()
+
+        reads, response = self.request(view)
+        self.assertEqual(reads, ["replica1", "default"])
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 10)
+
+        reads, _ = self.request(lambda read: read(), cookies={STICKY_COOKIE: "1"})
+        self.assertEqual(reads, ["default"])
+
+    def test_unsafe_methods_and_transactions_read_from_primary(self):
+        reads, _ = self.request(lambda read: read(), method="post")
+        self.assertEqual(reads, ["default"])
+        with mock.patch.object(connection, "in_atomic_block", True):
+            reads, _ = self.request(lambda read: read())
+        self.assertEqual(reads, ["default"])
+
+    def test_writes_in_async_views_are_seen(self):
+        async def get_response(request):
+            await sync_to_async(router.db_for_write)(Listing)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        response = asyncio.run(middleware(RequestFactory().post("/")))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_without_replicas(self):
+        def view(read):
+            read()
+            router.db_for_write(Listing)
+
+        with self.settings(DATABASE_REPLICAS=[]):
+            reads, response = self.request(view)
+        self.assertEqual(reads, ["default"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_other_apps_are_left_to_the_default(self):
+        # The table of DatabaseCache, whose sets must not pin anyone.
+        cache_entry = DatabaseCache("cache_table", {}).cache_model_class
+
+        def view(read):
+            router.db_for_write(cache_entry)
+            cache_reads.append(router.db_for_read(cache_entry))
+            read()
+
+        cache_reads = []
+        reads, response = self.request(view)
+        self.assertEqual(cache_reads, ["default"])
+        self.assertEqual(reads, ["replica1"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_migrations_only_run_on_the_primary(self):
+        self.assertFalse(router.allow_migrate("replica1", "auctions"))
+        self.assertTrue(router.allow_migrate("default", "auctions"))
+
+
+class LiveUpdatesConnectionTests(TransactionTestCase):
+    async def open_socket(self, path):
+        incoming = asyncio.Queue()
+        outgoing = asyncio.Queue()
+        await incoming.put({"type": "websocket.connect"})
+        await incoming.put({"type": "websocket.disconnect", "code": 1000})
+        scope = {"type": "websocket", "path": path}
+        await websocket_application(scope, incoming.get, outgoing.put)
+        return (await outgoing.get())["type"]
+
+    def test_broken_connections_are_dropped_around_the_lookup(self):
+        listing = create_listing(User.objects.create_user("seller"))
+        path = f"/ws/listing/{listing.pk}/"
+        connection.ensure_connection()
+        connection.errors_occurred = True  # As left by a lost connection.
+        with mock.patch.object(
+            connection, "is_usable", return_value=False
+        ), mock.patch.object(connection, "close", wraps=connection.close) as close:
+            for _ in range(2):
+                self.assertEqual(
+                    async_to_sync(self.open_socket)(path), "websocket.accept"
+                )
+        # Before and after each lookup.
+        self.assertEqual(close.call_count, 4)
@@ -0,0 +1,333 @@
+"""Thumbnails of listing images, served from a local disk cache.
+
+Listing images are remote URLs, often of full-size photos. The first
+request for a thumbnail fetches the image once, through the fetcher named
+by ``THUMBNAIL_FETCHER``, and stores it under ``THUMBNAIL_ROOT`` keyed by
+the SHA-256 of its bytes. Each size and format is then resized from that
+copy on first use. Listings sharing an image share its files.
+
+Every size and format has a stable URL, derived from a hash of the image
+URL, so responses can be cached by browsers for a year; a new image gets a
+new URL. Past ``THUMBNAIL_CACHE_SIZE`` bytes, the least recently used
+files are deleted, and fetched again if needed.
+
+Layout under the root::
+
+    urls/ab/<url key>         the content hash of the image at that URL
+    originals/cd/<hash>       the image as fetched
+    variants/cd/<hash>-320.webp
+"""
+
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+from functools import cache
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Widths in pixels; thumbnails fit in a square of that side, never upscaled.
+WIDTHS = (160, 320, 640, 1280)
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Recently used files are only re-stamped this often, to spare the writes.
+TOUCH_INTERVAL = 3600
+# Attempts at opening a thumbnail that is evicted as soon as it is written.
+OPEN_ATTEMPTS = 3
+
+
+class ThumbnailError(Exception):
+    """The image could not be fetched or decoded."""
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+class HTTPFetcher:
+    """Fetch images over HTTP(S) from public addresses only.
+
+    Listing images are user-supplied URLs, so hosts resolving to private,
+    loopback or link-local addresses are refused, redirects included. The
+    check is made when connecting, on the address connected to, so a host
+    cannot resolve to a public address for the check and a private one for
+    the request. Proxies are not used.
+    """
+
+    timeout = 10
+
+    def fetch(self, url):
+        opener = urllib.request.build_opener(
+            urllib.request.ProxyHandler({}),
+            _PublicHTTPHandler,
+            _PublicHTTPSHandler,
+            _CheckedRedirectHandler,
+        )
+        request = urllib.request.Request(url, headers={"User-Agent": "auctions"})
+        _check_url(url)
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                data = response.read(MAX_SOURCE_BYTES + 1)
+        except (OSError, ValueError) as e:
+            raise ThumbnailError(f"Could not fetch {url}: {e}") from e
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ThumbnailError(f"{url} is larger than {MAX_SOURCE_BYTES} bytes.")
+        return data
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def _check_url(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ThumbnailError(f"Not an HTTP(S) URL: {url}")
+
+
+def _public_address(host, port):
+    """Resolve ``host``; return one of its addresses if all are public."""
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise ThumbnailError(f"Could not resolve {host}: {e}") from e
+    for *_, sockaddr in addresses:
+        if not ipaddress.ip_address(sockaddr[0]).is_global:
+            raise ThumbnailError(f"{host} is not a public address.")
+    return addresses[0][4][0]
+
+
+def _create_public_connection(
+    address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None
+):
+    host, port = address
+    return socket.create_connection(
+        (_public_address(host, port), port), timeout, source_address
+    )
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    # The Host header, and for HTTPS the SNI and certificate check, still
+    # use the host name; only the socket goes to the checked address. The
+    # port is the connection's, so it defaults to the scheme's.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class LocalFileFetcher:
+    """Read images from ``THUMBNAIL_LOCAL_ROOT`` by URL path, for tests."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.THUMBNAIL_LOCAL_ROOT).resolve()
+
+    def fetch(self, url):
+        path = (self.root / unquote(urlsplit(url).path).lstrip("/")).resolve()
+        if not path.is_relative_to(self.root):
+            raise ThumbnailError(f"{url} is outside {self.root}.")
+        try:
+            return path.read_bytes()
+        except OSError as e:
+            raise ThumbnailError(f"Could not read {path}: {e}") from e
+
+
+def get_fetcher():
+    return import_string(settings.THUMBNAIL_FETCHER)()
+
+
+class ThumbnailCache:
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Bytes written since the last size check; starting at the limit
+        # makes the first write in a process check.
+        self._written = max_bytes
+
+    def cached(self, key, width, format):
+        """Return the path of a thumbnail that is already on disk, or None."""
+        digest = self._read_text(self._url_path(key))
+        if digest is None:
+            return None
+        path = self._variant_path(digest, width, format)
+        return path if self._touch(path) else None
+
+    def thumbnail(self, url, width, format, fetcher=None):
+        """Return the path of the thumbnail, fetching and resizing if needed."""
+        url_path = self._url_path(url_key(url))
+        digest = self._read_text(url_path)
+        if digest is not None:
+            path = self._variant_path(digest, width, format)
+            if self._touch(path):
+                return path
+        data = None
+        if digest is not None:
+            try:
+                data = self._original_path(digest).read_bytes()
+            except FileNotFoundError:
+                pass
+        if data is None:
+            data = (fetcher or get_fetcher()).fetch(url)
+            _open(data)  # Reject anything that is not an image before storing.
+            digest = hashlib.sha256(data).hexdigest()
+            self._write(self._original_path(digest), data)
+            self._write(url_path, digest.encode())
+        else:
+            self._touch(self._original_path(digest))
+        path = self._variant_path(digest, width, format)
+        self._write(path, _resize(data, width, format))
+        return path
+
+    def open_cached(self, key, width, format):
+        """Open a thumbnail that is already on disk, or return None.
+
+        Also None if the file is evicted between the lookup and the open.
+        """
+        path = self.cached(key, width, format)
+        if path is None:
+            return None
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def open_thumbnail(self, url, width, format, fetcher=None):
+        """Open the thumbnail, fetching and resizing as ``thumbnail`` does."""
+        for _ in range(OPEN_ATTEMPTS):
+            path = self.thumbnail(url, width, format, fetcher)
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                pass  # Evicted since it was written: make it again.
+        raise ThumbnailError(f"{path} keeps being evicted; is the cache too small?")
+
+    def evict(self):
+        """Delete the least recently used files until under 90% of the limit."""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def _url_path(self, key):
+        return self.root / "urls" / key[:2] / key
+
+    def _original_path(self, digest):
+        return self.root / "originals" / digest[:2] / digest
+
+    def _variant_path(self, digest, width, format):
+        return self.root / "variants" / digest[:2] / f"{digest}-{width}.{format}"
+
+    @staticmethod
+    def _read_text(path):
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _touch(path):
+        """Mark ``path`` as recently used; False if it does not exist."""
+        try:
+            if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _write(self, path, data):
+        # Write then rename, so concurrent readers never see a partial file.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._written += len(data)
+            if self._written < self.max_bytes // 20:
+                return
+            self._written = 0
+        self.evict()
+
+
+@cache
+def _get_cache(root, max_bytes):
+    return ThumbnailCache(root, max_bytes)
+
+
+def get_thumbnail_cache():
+    return _get_cache(settings.THUMBNAIL_ROOT, settings.THUMBNAIL_CACHE_SIZE)
+
+
+def _open(data):
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Not a usable image: {e}") from e
+    return image
+
+
+def _resize(data, width, format):
+    image = ImageOps.exif_transpose(_open(data))
+    image.thumbnail((width, width))
+    if format == "jpeg" and image.mode != "RGB":
+        # JPEG has no alpha: flatten transparent images onto white.
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif format == "webp" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    output = BytesIO()
+    if format == "jpeg":
+        image.save(output, "JPEG", quality=82, optimize=True, progressive=True)
+    else:
+        image.save(output, "WEBP", quality=80, method=4)
+    return output.getvalue()
@@ -10,6 +10,14 @@ urlpatterns = [
     path("addAuctions/", views.new_auctions, name="addAuctions"),
     path("listing/<int:listing_id>", views.listing, name="listing"),
     path("bid/<int:listing_id>", views.bid, name="bid"),
+    path("api/bids/", views.bulk_bids, name="bulk_bids"),
+    path("api/listings/", views.api_listings, name="api_listings"),
+    path("api/listings/<int:listing_id>/", views.api_listing, name="api_listing"),
+    path(
+        "api/listings/<int:listing_id>/bids/",
+        views.api_listing_bids,
+        name="api_listing_bids",
+    ),
     path("watchlist/<int:listing_id>", views.watchlist, name="watchlist"),
     # skipcq: FLK-E501
     path(
@@ -19,5 +27,13 @@ urlpatterns = [
     ),
     path("listing/<int:listing_id>/close", views.close_auction, name="close_auction"),
     path("categories/", views.categories, name="categories"),
+    path("search/", views.search, name="search"),
     path("comment/<int:listing_id>", views.comment, name="comment"),
+    path("metrics", views.metrics, name="metrics"),
+    path("export/<str:kind>", views.export, name="export"),
+    path(
+        "thumbnails/<int:listing_id>/<str:key>/<int:width>.<str:format>",
+        views.thumbnail,
+        name="thumbnail",
+    ),
 ]
@@ -1,23 +1,103 @@
+import hashlib
+import json
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.db import IntegrityError
-from django.http import HttpResponseRedirect
-from django.shortcuts import render, redirect, get_object_or_404
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.db.models.functions import Coalesce
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
 
+from .bidding import place_bids
+from .cache import (
+    PAGE_CACHE_GENERATION_KEY,
+    aget_watchlist_count,
+    ainvalidate_watchlist_count,
+    anonymous_page_cache,
+    invalidate_watchlist_count,
+    purge_page_cache,
+)
+from .categories import aget_category_tree, get_category_tree
+from .exporter import CONTENT_TYPES, EXPORTS, aexport, parse_since
 from .forms import ListingForm, BidForm, CommentForm
-from .models import User, Listing, Watchlist
+from .live import publish_listing_event
+from .metrics import registry
+from .models import (
+    PRICE_RANGES,
+    Bid,
+    CategoryFacet,
+    Listing,
+    User,
+    Watchlist,
+    price_range,
+    price_range_bounds,
+)
+from .pagination import CursorPaginator, apaginate_listings
+from .search import search_listings
+from .thumbnails import FORMATS as THUMBNAIL_FORMATS
+from .thumbnails import WIDTHS as THUMBNAIL_WIDTHS
+from .thumbnails import ThumbnailError, get_thumbnail_cache, url_key
+
+MAX_BULK_BIDS = 5000
+# Seconds before an image that could not be fetched is tried again.
+THUMBNAIL_RETRY = 300
+
+API_LISTING_FIELDS = (
+    "id",
+    "title",
+    "category",
+    "image",
+    "starting_bid",
+    "current_bid",
+    "bid_count",
+    "active",
+    "ends_at",
+    "created",
+)
+API_PAGE_SIZE = 50
+
+
+async def arender(request, template_name, context):
+    """Render a template for an async view.
+
+    The user and the watchlist count are loaded with the async ORM first, so
+    the context processors don't query; the render itself then runs in the
+    sync thread, where template-time cache lookups are always allowed.
+    """
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        request.watchlist_count = await aget_watchlist_count(request.user.pk)
+    return await sync_to_async(render)(request, template_name, context)
 
 
-def index(request):
+@anonymous_page_cache
+async def index(request):
     list_user = Listing.objects.filter(active=True).order_by("-created")
-    paginator = Paginator(list_user, 10)
-    page_number = request.GET.get("page")
-    page_listings = paginator.get_page(page_number)
-    return render(request, "auctions/index.html", {"listings": page_listings})
+    page_listings = await apaginate_listings(request, list_user)
+    return await arender(request, "auctions/index.html", {"listings": page_listings})
 
 
 def login_view(request):
@@ -74,7 +154,7 @@ def register(request):
 
 @login_required
 def new_auctions(request):
-    category_choices = ListingForm.CATEGORY_CHOICES
+    category_choices = get_category_tree().choices()
     if request.method == "POST":
         form = ListingForm(request.POST)
         if form.is_valid():
@@ -98,21 +178,53 @@ def new_auctions(request):
     )
 
 
-def listing(request, listing_id):
-    auction = get_object_or_404(Listing, id=listing_id)
-    comments = auction.comments.all()
+def listing_context(request, auction, form):
+    """Context for auction.html with a fixed number of queries."""
+    is_watched = (
+        request.user.is_authenticated
+        and Watchlist.objects.filter(
+            user=request.user, listing=auction, active=True
+        ).exists()
+    )
+    return {
+        "listing": auction,
+        "comments": auction.comments.select_related("user"),
+        "form": form,
+        "is_watched": is_watched,
+    }
+
+
+async def alisting_context(request, auction, form):
+    user = await request.auser()
+    is_watched = (
+        user.is_authenticated
+        and await Watchlist.objects.filter(
+            user=user, listing=auction, active=True
+        ).aexists()
+    )
+    return {
+        "listing": auction,
+        "comments": [c async for c in auction.comments.select_related("user")],
+        "form": form,
+        "is_watched": is_watched,
+    }
+
+
+async def listing(request, listing_id):
+    auction = await aget_object_or_404(
+        Listing.objects.select_related("user", "winner"), id=listing_id
+    )
     form = CommentForm()
-    return render(
+    return await arender(
         request,
         "auctions/auction.html",
-        {"listing": auction, "comments": comments, "form": form},
+        await alisting_context(request, auction, form),
     )
 
 
 @login_required
 def bid(request, listing_id):
     auction = get_object_or_404(Listing, pk=listing_id)
-    comment_auction = auction.comments.all().count()
     if request.method == "POST":
         bid_form = BidForm(request.POST)
         if bid_form.is_valid():
@@ -122,7 +234,7 @@ def bid(request, listing_id):
                 messages.success(request, "Your bid has been placed successfully.")
                 messages.info(
                     request,
-                    f"({comment_auction}) bid(s) so far. Your bid is the current bid.",
+                    f"({auction.bid_count}) bid(s) so far. Your bid is the current bid.",
                 )
                 return redirect("listing", listing_id=listing_id)
             except ValidationError as e:
@@ -135,30 +247,189 @@ def bid(request, listing_id):
         return render(
             request,
             "auctions/auction.html",
-            {"listing": auction, "form": bid_form, "comments": auction.comments.all()},
+            listing_context(request, auction, bid_form),
         )
     return None
 
 
-def watchlist(request, listing_id):
-    user = request.user
+@require_POST
+def bulk_bids(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    try:
+        bids = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON."}, status=400)
+    if not isinstance(bids, list):
+        return JsonResponse({"error": "Expected an array of bids."}, status=400)
+    if len(bids) > MAX_BULK_BIDS:
+        return JsonResponse(
+            {"error": f"At most {MAX_BULK_BIDS} bids per request."}, status=400
+        )
+    results = place_bids(request.user, bids)
+    accepted = sum(result["status"] == "accepted" for result in results)
+    return JsonResponse(
+        {
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": results,
+        }
+    )
+
+
+def _api_etag(request, *parts):
+    # Strong validator: the representation is byte-for-byte determined by
+    # the URL and the listing state the parts describe.
+    key = "|".join([request.get_full_path(), *map(str, parts)])
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def _listings_state(request):
+    # Every change to a listing moves "updated" forward. Deletions and
+    # category renames do not, but they purge the page cache, so its
+    # generation covers them without counting the table. The maximum is
+    # read from the "updated" index.
+    if not hasattr(request, "_listings_state"):
+        request._listings_state = {
+            "updated": Listing.objects.aggregate(updated=Max("updated"))["updated"],
+            "generation": cache.get(PAGE_CACHE_GENERATION_KEY, 0),
+        }
+    return request._listings_state
+
+
+def _listing_state(request, listing_id):
+    if not hasattr(request, "_listing_state"):
+        request._listing_state = (
+            Listing.objects.filter(pk=listing_id).values("version", "updated").first()
+        )
+    return request._listing_state
+
+
+def _listings_etag(request):
+    state = _listings_state(request)
+    return _api_etag(request, state["generation"], state["updated"])
+
+
+def _listings_last_modified(request):
+    return _listings_state(request)["updated"]
+
+
+def _listing_etag(request, listing_id):
+    state = _listing_state(request, listing_id)
+    return state and _api_etag(request, state["version"])
+
+
+def _listing_last_modified(request, listing_id):
+    state = _listing_state(request, listing_id)
+    return state and state["updated"]
+
+
+def _api_url(request, **params):
+    query = request.GET.copy()
+    for name, value in params.items():
+        query[name] = value
+    return f"{request.path}?{query.urlencode()}"
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=_listings_etag, last_modified_func=_listings_last_modified)
+def api_listings(request):
+    tree = get_category_tree()
+    listings = Listing.objects.filter(active=True)
+    category = request.GET.get("category")
+    if category:
+        listings = tree.filter_listings(listings, category)
+    page = CursorPaginator(
+        listings.values(*API_LISTING_FIELDS), API_PAGE_SIZE
+    ).get_page(request.GET.get("cursor"))
+    for row in page.object_list:
+        row["category"] = tree.name(row["category"])
+    return JsonResponse(
+        {
+            "results": page.object_list,
+            "next": (
+                _api_url(request, cursor=page.next_cursor) if page.has_next() else None
+            ),
+            "previous": (
+                _api_url(request, cursor=page.previous_cursor)
+                if page.has_previous()
+                else None
+            ),
+        }
+    )
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=_listing_etag, last_modified_func=_listing_last_modified)
+def api_listing(request, listing_id):
+    listings = Listing.objects.filter(pk=listing_id).values(
+        *API_LISTING_FIELDS,
+        "description",
+        "updated",
+        seller=F("user__username"),
+        winner_username=F("winner__username"),
+    )
+    listing = listings.first()
+    if listing is None:
+        return JsonResponse({"error": "Listing not found."}, status=404)
+    listing["winner"] = listing.pop("winner_username")
+    listing["category"] = get_category_tree().name(listing["category"])
+    return JsonResponse(listing)
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=_listing_etag, last_modified_func=_listing_last_modified)
+def api_listing_bids(request, listing_id):
+    if _listing_state(request, listing_id) is None:
+        return JsonResponse({"error": "Listing not found."}, status=404)
+    bids = (
+        Bid.objects.filter(listing_id=listing_id)
+        .order_by("-amount")
+        .values("id", "amount", bidder=F("user__username"))
+    )
+    page = Paginator(bids, API_PAGE_SIZE).get_page(request.GET.get("page"))
+    return JsonResponse(
+        {
+            "count": page.paginator.count,
+            "results": list(page.object_list),
+            "next": (
+                _api_url(request, page=page.next_page_number())
+                if page.has_next()
+                else None
+            ),
+            "previous": (
+                _api_url(request, page=page.previous_page_number())
+                if page.has_previous()
+                else None
+            ),
+        }
+    )
+
+
+async def watchlist(request, listing_id):
+    user = await request.auser()
     if request.method == "POST":
         listings_in_watchlist = Watchlist.objects.filter(
             user=user, listing__id=listing_id
         )
-        if listings_in_watchlist.exists():
-            listings_in_watchlist.update(active=True)
+        if await listings_in_watchlist.aexists():
+            await listings_in_watchlist.aupdate(active=True)
+            await ainvalidate_watchlist_count(user.pk)
             return HttpResponseRedirect(reverse("watchlist", args=[user.id]))
-        current_listing = Listing.objects.get(pk=listing_id)
-        Watchlist.objects.create(user=user, listing=current_listing, active=True)
+        current_listing = await Listing.objects.aget(pk=listing_id)
+        await Watchlist.objects.acreate(user=user, listing=current_listing, active=True)
+        await ainvalidate_watchlist_count(user.pk)
         return HttpResponseRedirect(reverse("watchlist", args=[user.id]))
     listings_in_watchlist = Listing.objects.filter(
         watchlist__user=user, watchlist__active=True
     ).order_by("-created")
-    paginator = Paginator(listings_in_watchlist, 10)
-    page_number = request.GET.get("page")
-    page_listings = paginator.get_page(page_number)
-    return render(request, "auctions/watchList.html", {"listings": page_listings})
+    page_listings = await apaginate_listings(request, listings_in_watchlist)
+    return await arender(
+        request, "auctions/watchList.html", {"listings": page_listings}
+    )
 
 
 def watchlist_remove(request, listing_id):
@@ -167,52 +438,146 @@ def watchlist_remove(request, listing_id):
     watchlist_item = Watchlist.objects.get(user=user, listing=current_listing)
     watchlist_item.active = False
     watchlist_item.save()
+    invalidate_watchlist_count(user.pk)
     return HttpResponseRedirect(reverse("watchlist", args=[user.id]))
 
 
 def close_auction(request, listing_id):
     listing = get_object_or_404(Listing, id=listing_id)
 
-    if request.user != listing.user:
+    if request.user.pk != listing.user_id:
         messages.error(request, "You are not authorized to close this auction.")
         return redirect("listing", listing_id=listing_id)
-    highest_bid = listing.bids.order_by("-amount").first()
-    if highest_bid:
-        listing.winner = highest_bid.user
-    else:
+    with transaction.atomic():
+        # One conditional UPDATE, so a bid accepted after the listing was
+        # read still decides the winner.
+        closed = Listing.objects.filter(pk=listing.pk, active=True).update(
+            active=False,
+            winner=F("top_bid_user"),
+            version=F("version") + 1,
+            updated=timezone.now(),
+        )
+        if not closed:
+            messages.warning(request, "This auction is already closed.")
+            return redirect("listing", listing_id=listing_id)
+        # Read in the same transaction as the UPDATE, so no bid came between.
+        listing = Listing.objects.select_related("winner").get(pk=listing.pk)
+        CategoryFacet.objects.adjust(
+            {(listing.category_id, price_range(listing.price)): -1}
+        )
+        transaction.on_commit(purge_page_cache)
+    if listing.winner is None:
         messages.warning(request, "No bids were placed on this listing.")
-    listing.active = False
-    listing.save()
+    publish_listing_event(
+        listing.pk,
+        {
+            "type": "closed",
+            "winner": listing.winner.username if listing.winner else None,
+        },
+    )
     messages.success(request, "The auction has been closed.")
     return redirect("listing", listing_id=listing_id)
 
 
-def categories(request):
+def _price_range_label(index):
+    low, high = price_range_bounds(index)
+    if low is None:
+        return f"Under ${high:,.0f}"
+    if high is None:
+        return f"${low:,.0f} and up"
+    return f"${low:,.0f} - ${high:,.0f}"
+
+
+async def acategory_facets(tree, selected):
+    """Return the category, subcategory and price range facets with counts.
+
+    Read from the ``CategoryFacet`` counters: one small query, however many
+    listings there are. A category counts the listings of its whole
+    subtree. Subcategories are those of the selected category's top-level
+    category; price ranges are counted within the selected category, or
+    across all of them.
+    """
+    counts = defaultdict(Counter)
+    async for category_id, index, count in CategoryFacet.objects.filter(
+        count__gt=0
+    ).values_list("category", "price_range", "count"):
+        counts[category_id][index] += count
+
+    def total(category):
+        return sum(counts[pk].total() for pk in tree.subtree_ids(category))
+
+    categories = [(category.name, total(category)) for category in tree.roots]
+    subcategories = []
+    scope = counts.keys()
+    if selected is not None:
+        subcategories = [
+            (category.name, total(category))
+            for category in tree.children[tree.root_of(selected).pk]
+        ]
+        scope = tree.subtree_ids(selected)
+    price_ranges = [
+        (
+            index,
+            _price_range_label(index),
+            sum(counts[pk][index] for pk in scope if pk in counts),
+        )
+        for index in range(len(PRICE_RANGES) + 1)
+    ]
+    return categories, subcategories, price_ranges
+
+
+@anonymous_page_cache
+async def categories(request):
+    tree = await aget_category_tree()
     category = request.GET.get("category")
+    listings = Listing.objects.filter(active=True)
     if category:
-        listings = Listing.objects.filter(category=category, active=True).order_by(
-            "-created"
-        )
-    else:
-        listings = Listing.objects.filter(active=True).order_by("-created")
-    paginator = Paginator(listings, 10)
-    page_number = request.GET.get("page")
-    listings = paginator.get_page(page_number)
-    return render(
+        listings = tree.filter_listings(listings, category)
+    price = request.GET.get("price", "")
+    price = (
+        int(price) if price.isdecimal() and int(price) <= len(PRICE_RANGES) else None
+    )
+    if price is not None:
+        low, high = price_range_bounds(price)
+        listings = listings.alias(current_price=Coalesce("current_bid", "starting_bid"))
+        if low is not None:
+            listings = listings.filter(current_price__gte=low)
+        if high is not None:
+            listings = listings.filter(current_price__lt=high)
+    listings = await apaginate_listings(request, listings.order_by("-created"))
+    selected = tree.by_name.get(category)
+    category_facets, subcategory_facets, price_facets = await acategory_facets(
+        tree, selected
+    )
+    return await arender(
         request,
         "auctions/categories.html",
         {
             "listings": listings,
-            "category_choices": ListingForm.CATEGORY_CHOICES,
+            "category_facets": category_facets,
+            "subcategory_facets": subcategory_facets,
+            "price_facets": price_facets,
             "selected_category": category,
+            "selected_root": tree.root_of(selected).name if selected else None,
+            "selected_price": price,
         },
     )
 
 
+def search(request):
+    query = request.GET.get("q", "").strip()
+    results = search_listings(query)
+    listings = Paginator(results, 10).get_page(request.GET.get("page"))
+    return render(
+        request,
+        "auctions/search.html",
+        {"listings": listings, "query": query},
+    )
+
+
 @login_required
 def comment(request, listing_id):
     auction = get_object_or_404(Listing, pk=listing_id)
-    comments = auction.comments.filter(listing=auction)
     if request.method == "POST":
         form = CommentForm(request.POST)
         if form.is_valid():
@@ -226,6 +591,89 @@ def comment(request, listing_id):
             return render(
                 request,
                 "auctions/auction.html",
-                {"listing": auction, "comments": comments, "form": form},
+                listing_context(request, auction, form),
             )
     return redirect("listing", listing_id=listing_id)
+
+
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not (
+        request.user.is_staff
+        or (token and constant_time_compare(authorization, f"Bearer {token}"))
+    ):
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@staff_member_required
+@require_GET
+async def export(request, kind):
+    """Stream a CSV or JSON Lines export; see ``auctions.exporter``.
+
+    Takes ``format`` (csv or jsonl), ``since`` (an ISO date or datetime) and
+    ``gzip`` query parameters.
+    """
+    if kind not in EXPORTS:
+        raise Http404("No such export.")
+    format = request.GET.get("format", "csv")
+    if format not in CONTENT_TYPES:
+        return HttpResponse("Unknown format.", status=400, content_type="text/plain")
+    try:
+        since = parse_since(request.GET["since"]) if request.GET.get("since") else None
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type="text/plain")
+    gzip = request.GET.get("gzip") in ("1", "true")
+    response = StreamingHttpResponse(
+        aexport(kind, since, format, gzip),
+        content_type="application/gzip" if gzip else CONTENT_TYPES[format],
+    )
+    filename = f"{kind}.{format}.gz" if gzip else f"{kind}.{format}"
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
+
+
+@require_GET
+async def thumbnail(request, listing_id, key, width, format):
+    """Serve a thumbnail of a listing's image; see ``auctions.thumbnails``.
+
+    ``key`` is derived from the image URL, so the response never changes and
+    is cached for a year. A thumbnail already on disk is served without
+    touching the database. If the image cannot be fetched, this redirects
+    to the original for a while.
+    """
+    if width not in THUMBNAIL_WIDTHS or format not in THUMBNAIL_FORMATS:
+        raise Http404("No such thumbnail size.")
+    thumbnails = get_thumbnail_cache()
+    # File access runs in threads, off the event loop; not thread-sensitive,
+    # so that a slow disk or fetch does not hold up the one thread the other
+    # sync code runs in.
+    file = await sync_to_async(thumbnails.open_cached, thread_sensitive=False)(
+        key, width, format
+    )
+    if file is None:
+        image = (
+            await Listing.objects.filter(pk=listing_id)
+            .values_list("image", flat=True)
+            .afirst()
+        )
+        if not image or url_key(image) != key:
+            raise Http404("No such image.")
+        failed_key = f"auctions:thumbnail_failed:{key}"
+        try:
+            if await cache.aget(failed_key):
+                raise ThumbnailError(f"{image} failed recently.")
+            file = await sync_to_async(
+                thumbnails.open_thumbnail, thread_sensitive=False
+            )(image, width, format)
+        except ThumbnailError:
+            await cache.aset(failed_key, True, THUMBNAIL_RETRY)
+            response = HttpResponseRedirect(image)
+            patch_cache_control(response, public=True, max_age=THUMBNAIL_RETRY)
+            return response
+    response = FileResponse(file, content_type=THUMBNAIL_FORMATS[format])
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    return response
@@ -0,0 +1,34 @@
+"""Standalone performance benchmarks.
+
+Each module can be run from the project root, e.g.::
+
+    python -m benchmarks.card_render
+"""
+
+import os
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "commerce.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Run the body against a freshly migrated, throwaway test database."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
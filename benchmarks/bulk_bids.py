@@ -0,0 +1,74 @@
+"""Throughput of the bulk bid API against placing the same bids one by one."""
+
+import argparse
+import json
+import time
+from decimal import Decimal
+
+from . import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=200)
+    parser.add_argument("--bids", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client
+    from django.urls import reverse
+
+    from auctions.models import Listing, User
+
+    with test_database():
+        seller = User.objects.create_user("seller")
+        bidder = User.objects.create_user("bidder")
+
+        def seed():
+            Listing.objects.all().delete()
+            Listing.objects.bulk_create(
+                Listing(user=seller, title=f"Listing {i}", starting_bid=Decimal(1))
+                for i in range(args.listings)
+            )
+            return list(Listing.objects.values_list("pk", flat=True))
+
+        def bids(listing_ids):
+            return [
+                {
+                    "listing": listing_ids[i % len(listing_ids)],
+                    "amount": str(Decimal(i + 1)),
+                }
+                for i in range(args.bids)
+            ]
+
+        listing_ids = seed()
+        listings = {listing.pk: listing for listing in Listing.objects.all()}
+        start = time.perf_counter()
+        for bid in bids(listing_ids):
+            listings[bid["listing"]].place_bid(bidder, Decimal(bid["amount"]))
+        one_by_one = args.bids / (time.perf_counter() - start)
+
+        listing_ids = seed()
+        client = Client()
+        client.force_login(bidder)
+        payload = bids(listing_ids)
+        url = reverse("bulk_bids")
+        start = time.perf_counter()
+        for offset in range(0, len(payload), args.batch_size):
+            response = client.post(
+                url,
+                json.dumps(payload[offset : offset + args.batch_size]),
+                content_type="application/json",
+            )
+            assert response.json()["rejected"] == 0, response.json()
+        bulk = args.bids / (time.perf_counter() - start)
+
+    print(f"{args.bids} bids over {args.listings} listings (bids/s)")
+    print(f"{'place_bid, one by one':28}{one_by_one:>10.0f}")
+    print(f"{f'bulk API, {args.batch_size} per request':28}{bulk:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Template render time of a 10-card listing page, cold vs. fragment-cached.
+
+Cold renders clear the cache first, which is what every request paid before
+listing cards were fragment-cached. The card shows its category name and
+keys on the category tree, so this runs against a throwaway migrated
+database, whose default categories include the one used, and loads the
+tree before timing. The timed renders run no queries.
+"""
+
+import argparse
+import statistics
+import time
+from decimal import Decimal
+
+from . import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cards", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.template import engines
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+
+    from auctions.categories import get_category_tree
+    from auctions.models import Category, Listing
+
+    template = engines["django"].from_string(
+        "{% for auction in listings %}"
+        '{% include "auctions/components/card.html" %}'
+        "{% endfor %}"
+    )
+
+    def measure(context, clear):
+        timings = []
+        for _ in range(args.rounds):
+            if clear:
+                cache.clear()
+            start = time.perf_counter()
+            template.render(context)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    with test_database():
+        category = Category.objects.get(name="Books")  # Created by migration.
+        get_category_tree()
+        listings = [
+            Listing(
+                pk=pk,
+                title=f"Listing {pk}",
+                description="A fairly long description of the item. " * 5,
+                starting_bid=Decimal("10.00"),
+                current_bid=Decimal("12.50"),
+                image=f"https://example.com/{pk}.jpg",
+                category=category,
+                created=timezone.now(),
+                bid_count=3,
+            )
+            for pk in range(1, args.cards + 1)
+        ]
+        context = {"listings": listings}
+
+        with CaptureQueriesContext(connection) as queries:
+            cold = measure(context, clear=True)
+            template.render(context)
+            warm = measure(context, clear=False)
+        assert not queries, f"{len(queries)} queries while rendering"
+
+    print(f"{args.cards}-card page, {args.rounds} rounds (ms)")
+    print(f"{'':8}{'median':>10}{'p99':>10}")
+    for label, timings in (("cold", cold), ("cached", warm)):
+        p99 = statistics.quantiles(timings, n=100)[98]
+        print(f"{label:8}{statistics.median(timings):>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
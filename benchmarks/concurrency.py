@@ -0,0 +1,151 @@
+"""Concurrent-connection capacity of the WSGI and ASGI deploy profiles.
+
+Starts each server on a seeded SQLite database with the same number of
+worker processes, parks ``--slow-clients`` connections that trickle in
+request headers (slow mobile clients, or a slowloris), and meanwhile fires
+``--requests`` ordinary page loads, ``--concurrency`` at a time. Sync workers
+are held by the slow clients; the ASGI server is not.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .data import create_database, generate
+
+PROFILES = {
+    "wsgi": ["gunicorn", "commerce.wsgi", "--bind", "127.0.0.1:{port}"],
+    "asgi": ["uvicorn", "commerce.asgi:application", "--port", "{port}"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def fetch(port, path, timeout):
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection("127.0.0.1", port), timeout
+    )
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            "Connection: close\r\n\r\n".encode()
+        )
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    if not response.startswith(b"HTTP/1.1 200"):
+        raise ValueError(response[:40])
+    return time.perf_counter() - start
+
+
+async def slow_client(port, stop):
+    _reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n")
+    while not stop.is_set() and not writer.is_closing():
+        writer.write(b"X-Padding: 1\r\n")
+        try:
+            await asyncio.wait_for(stop.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+    writer.close()
+
+
+async def load(port, args):
+    stop = asyncio.Event()
+    parked = [
+        asyncio.create_task(slow_client(port, stop)) for _ in range(args.slow_clients)
+    ]
+    await asyncio.sleep(1)
+
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with gate:
+            try:
+                return await fetch(port, "/", args.timeout)
+            except (OSError, ValueError, asyncio.TimeoutError):
+                return None
+
+    start = time.perf_counter()
+    timings = await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*parked, return_exceptions=True)
+    return [t for t in timings if t is not None], elapsed
+
+
+async def wait_until_up(port):
+    for _ in range(100):
+        try:
+            await fetch(port, "/", 5)
+            return
+        except (OSError, ValueError, asyncio.TimeoutError):
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_profile(name, env, args):
+    port = free_port()
+    command = [part.format(port=port) for part in PROFILES[name]]
+    command += ["--workers", str(args.workers)]
+    server = subprocess.Popen(
+        command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        asyncio.run(wait_until_up(port))
+        return asyncio.run(load(port, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--slow-clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--listings", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Measure the views, not the anonymous page cache.
+        os.environ["ANONYMOUS_PAGE_CACHE_TIMEOUT"] = "0"
+        create_database(os.path.join(tmp, "db.sqlite3"))
+        generate(users=1, listings=args.listings, bids=0, comments=0)
+        env = dict(os.environ, PYTHONPATH=os.getcwd())
+
+        print(
+            f"{args.requests} GET / at concurrency {args.concurrency}, "
+            f"{args.slow_clients} slow clients, {args.workers} workers"
+        )
+        print(f"{'':6}{'ok':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        for name in PROFILES:
+            timings, elapsed = run_profile(name, env, args)
+            if len(timings) > 1:
+                p50 = statistics.median(timings) * 1000
+                p99 = statistics.quantiles(timings, n=100)[98] * 1000
+            else:
+                p50 = p99 = float("nan")
+            print(
+                f"{name:6}{len(timings):>6}{len(timings) / elapsed:>9.1f}"
+                f"{p50:>9.1f}{p99:>9.1f}"
+            )
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
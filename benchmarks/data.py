@@ -0,0 +1,125 @@
+"""Deterministic benchmark data, inserted with ``bulk_create``."""
+
+import os
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from . import setup_django
+
+CATEGORIES = ("Fashion", "Toys", "Electronics", "Home", "Books", "Other")
+WORDS = (
+    "vintage",
+    "lamp",
+    "chair",
+    "guitar",
+    "camera",
+    "novel",
+    "puzzle",
+    "jacket",
+    "watch",
+    "bicycle",
+    "record",
+    "kettle",
+    "poster",
+    "tablet",
+    "sofa",
+    "mirror",
+    "drone",
+    "sneakers",
+    "atlas",
+    "robot",
+)
+
+
+@dataclass
+class Dataset:
+    user_ids: list
+    listing_ids: list
+    # Seller of each listing, by listing id.
+    sellers: dict
+
+
+def create_database(path):
+    """Point Django at a fresh SQLite file at ``path`` and migrate it.
+
+    Server subprocesses started with the same environment share the file.
+    """
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    os.environ["BENCHMARK_DATABASE"] = path
+    setup_django()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def generate(users=50, listings=2000, bids=10000, comments=2000, seed=0):
+    """Seed the database and return the ids the scenarios need.
+
+    Bids go to random listings in increasing amounts, and the denormalized
+    bid stats are written to match, as ``Listing.place_bid`` would leave them.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.db import transaction
+    from django.utils import timezone
+
+    from auctions.models import Bid, Category, CategoryFacet, Comment, Listing, User
+    from auctions.search import get_search_backend
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(None)
+    with transaction.atomic():
+        categories = list(Category.objects.filter(name__in=CATEGORIES))
+        user_objs = User.objects.bulk_create(
+            User(username=f"user{i}", password=password) for i in range(users)
+        )
+        listing_objs = Listing.objects.bulk_create(
+            Listing(
+                user=rng.choice(user_objs),
+                title=" ".join(rng.sample(WORDS, 3)).title() + f" #{i}",
+                description=" ".join(rng.choices(WORDS, k=40)),
+                starting_bid=Decimal(rng.randrange(100, 10000)) / 100,
+                category=rng.choice(categories),
+                ends_at=now + timedelta(hours=rng.randrange(1, 24 * 14)),
+            )
+            for i in range(listings)
+        )
+        bid_objs = []
+        for _ in range(bids):
+            listing = rng.choice(listing_objs)
+            amount = (listing.current_bid or listing.starting_bid) + Decimal("1.00")
+            bidder = rng.choice(user_objs)
+            listing.current_bid = amount
+            listing.bid_count += 1
+            listing.top_bid_user = bidder
+            bid_objs.append(Bid(user=bidder, listing=listing, amount=amount))
+        Bid.objects.bulk_create(bid_objs, batch_size=1000)
+        Listing.objects.bulk_update(
+            listing_objs,
+            ["current_bid", "bid_count", "top_bid_user"],
+            batch_size=1000,
+        )
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    user=rng.choice(user_objs),
+                    listing=rng.choice(listing_objs),
+                    text=" ".join(rng.choices(WORDS, k=12)),
+                )
+                for _ in range(comments)
+            ),
+            batch_size=1000,
+        )
+        # bulk_create skips Listing.save and the post_save signal, which
+        # maintain the facet counters and search.
+        CategoryFacet.objects.rebuild()
+        get_search_backend().index(listing_objs)
+
+    return Dataset(
+        user_ids=[user.pk for user in user_objs],
+        listing_ids=[listing.pk for listing in listing_objs],
+        sellers={listing.pk: listing.user_id for listing in listing_objs},
+    )
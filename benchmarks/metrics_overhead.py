@@ -0,0 +1,106 @@
+"""Per-request cost of the metrics middleware and query wrapper.
+
+Requests the same pages through two test clients, one whose middleware chain
+was built without ``MetricsMiddleware``, alternating in short blocks so
+machine noise hits both alike. The query wrapper is detached during the
+uninstrumented blocks. With no request being recorded the template timer is
+a single context variable lookup per render, so both runs use the timed
+template backend.
+"""
+
+import argparse
+import statistics
+import time
+import timeit
+
+from . import setup_django, test_database
+
+BLOCK = 25
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from auctions.metrics import record_queries
+    from auctions.models import Listing, User
+
+    middleware = [
+        name for name in settings.MIDDLEWARE if not name.endswith("MetricsMiddleware")
+    ]
+
+    with test_database(), override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0):
+        seller = User.objects.create_user("seller")
+        Listing.objects.bulk_create(
+            Listing(user=seller, title=f"Listing {i}", starting_bid=1)
+            for i in range(50)
+        )
+        listing = Listing.objects.first()
+        urls = {
+            "index": reverse("index"),
+            "listing": reverse("listing", args=[listing.pk]),
+            "api_listing": reverse("api_listing", args=[listing.pk]),
+        }
+
+        instrumented = Client()
+        instrumented.get(urls["index"])
+        assert record_queries in connection.execute_wrappers
+        plain = Client()
+        # The handler builds its middleware chain on the first request.
+        with override_settings(MIDDLEWARE=middleware):
+            plain.get(urls["index"])
+
+        def block(client, url, timings):
+            for _ in range(BLOCK):
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        results = {}
+        for name, url in urls.items():
+            on, off = [], []
+            for _ in range(args.rounds // BLOCK):
+                block(instrumented, url, on)
+                connection.execute_wrappers.remove(record_queries)
+                block(plain, url, off)
+                connection.execute_wrappers.append(record_queries)
+            results[name] = statistics.median(off), statistics.median(on)
+
+    # The fixed costs in isolation, free of request noise.
+    from auctions import metrics
+
+    def bookkeeping():
+        metrics.finish_request(metrics.start_request(), "benchmark", 0.001)
+
+    def query():
+        token = metrics.start_request()
+        record_queries(lambda *args: None, "", (), False, {})
+        metrics._current.reset(token)
+
+    micro = {
+        "per request": timeit.timeit(bookkeeping, number=100_000) * 10,
+        "per query": (timeit.timeit(query, number=100_000) * 10)
+        - timeit.timeit(
+            lambda: metrics._current.reset(metrics.start_request()), number=100_000
+        )
+        * 10,
+    }
+
+    print(f"median ms per request, {args.rounds} requests each")
+    print(f"{'':14}{'off':>9}{'on':>9}{'overhead':>10}")
+    for name, (off, on) in results.items():
+        print(f"{name:14}{off:>9.3f}{on:>9.3f}{on - off:>+10.3f}")
+    for name, microseconds in micro.items():
+        print(f"bookkeeping {name}: {microseconds:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
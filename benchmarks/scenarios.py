@@ -0,0 +1,89 @@
+"""Scripted user workflows for the benchmark suite.
+
+Each scenario drives the site through ``call(method, path, data=None,
+user=None, expect=200)``, which times the request and returns the response
+body. Scenarios run in the order listed in ``SCENARIOS``; ``close_auction``
+is last because it ends auctions the others use.
+"""
+
+import re
+from decimal import Decimal
+from html import unescape
+
+from .data import CATEGORIES
+
+NEXT_PAGE = re.compile(rb'href="(\?[^"]*)"\s*title="Next Page"')
+
+
+def _browse(call, user, rng, iterations):
+    for _ in range(iterations):
+        body = call("GET", "/", user=user)
+        for _ in range(4):
+            match = NEXT_PAGE.search(body)
+            if match is None:
+                break
+            body = call("GET", "/" + unescape(match.group(1).decode()), user=user)
+        call("GET", "/categories/", {"category": rng.choice(CATEGORIES)}, user=user)
+
+
+def browse(call, data, rng, iterations):
+    """Anonymous visitor paging through the feed, mostly page-cache hits."""
+    _browse(call, None, rng, iterations)
+
+
+def browse_signed_in(call, data, rng, iterations):
+    """Signed-in user paging through the feed, which is never page-cached."""
+    _browse(call, rng.choice(data.user_ids), rng, iterations)
+
+
+def listing_detail(call, data, rng, iterations):
+    for _ in range(iterations):
+        listing_id = rng.choice(data.listing_ids)
+        call("GET", f"/listing/{listing_id}", user=rng.choice(data.user_ids))
+
+
+def watchlist_toggle(call, data, rng, iterations):
+    for _ in range(iterations):
+        user, listing_id = rng.choice(data.user_ids), rng.choice(data.listing_ids)
+        call("POST", f"/watchlist/{listing_id}", user=user, expect=302)
+        call("GET", f"/Watchlist_remove/{listing_id}", user=user, expect=302)
+
+
+def bid_war(call, data, rng, iterations):
+    """Two users outbidding each other on one hot listing."""
+    from auctions.models import Listing
+
+    hot = Listing.objects.get(pk=data.listing_ids[0])
+    bidders = [user for user in data.user_ids if user != hot.user_id][:2]
+    amount = hot.current_bid or hot.starting_bid
+    for i in range(iterations):
+        amount += Decimal("1.00")
+        call(
+            "POST",
+            f"/bid/{hot.pk}",
+            {"amount": str(amount)},
+            user=bidders[i % 2],
+            expect=302,
+        )
+
+
+def close_auction(call, data, rng, iterations):
+    # The newest listings, which the other scenarios touch least.
+    for listing_id in data.listing_ids[-iterations:]:
+        call(
+            "POST",
+            f"/listing/{listing_id}/close",
+            user=data.sellers[listing_id],
+            expect=302,
+        )
+
+
+# Scenario and its default number of iterations.
+SCENARIOS = {
+    "browse": (browse, 20),
+    "browse_signed_in": (browse_signed_in, 20),
+    "listing_detail": (listing_detail, 100),
+    "watchlist_toggle": (watchlist_toggle, 50),
+    "bid_war": (bid_war, 100),
+    "close_auction": (close_auction, 50),
+}
@@ -0,0 +1,87 @@
+"""Database queries per signed-in page view, by session engine.
+
+Signs a user in under each ``SESSION_ENGINE``, visits every page once to
+warm the caches, then counts the queries of ``--rounds`` further visits,
+session queries separately. "bid" posts a bid and follows the redirect back
+to the listing, with its flash message.
+"""
+
+import argparse
+from decimal import Decimal
+
+from . import setup_django, test_database
+
+ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached": "auctions.sessions",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from auctions.models import Listing, User
+
+    with test_database():
+        seller = User.objects.create_user("seller")
+        bidder = User.objects.create_user("bidder", password="password")
+        Listing.objects.bulk_create(
+            Listing(user=seller, title=f"Listing {i}", starting_bid=1)
+            for i in range(50)
+        )
+        listing = Listing.objects.first()
+        bid = Decimal(2)
+
+        def place_bid(client):
+            nonlocal bid
+            bid += 1
+            url = reverse("bid", args=[listing.pk])
+            return client.post(url, {"amount": bid}, follow=True)
+
+        pages = {
+            "index": lambda client: client.get(reverse("index")),
+            "categories": lambda client: client.get(reverse("categories")),
+            "listing": lambda client: client.get(reverse("listing", args=[listing.pk])),
+            "watchlist": lambda client: client.get(
+                reverse("watchlist", args=[bidder.pk])
+            ),
+            "bid": place_bid,
+        }
+
+        results = {}
+        for engine, path in ENGINES.items():
+            with override_settings(SESSION_ENGINE=path):
+                client = Client()
+                client.login(username="bidder", password="password")
+                for name, visit in pages.items():
+                    visit(client)
+                    with CaptureQueriesContext(connection) as queries:
+                        for _ in range(args.rounds):
+                            assert visit(client).status_code == 200
+                    session = sum("django_session" in q["sql"] for q in queries)
+                    results[name, engine] = len(queries), session
+
+    print(f"queries per view (session queries), {args.rounds} views each")
+    print(f"{'':12}" + "".join(f"{engine:>14}" for engine in ENGINES))
+    for name in pages:
+        cells = (results[name, engine] for engine in ENGINES)
+        print(
+            f"{name:12}"
+            + "".join(
+                f"{total / args.rounds:>9.1f} ({session / args.rounds:.0f})"
+                for total, session in cells
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
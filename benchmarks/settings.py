@@ -0,0 +1,8 @@
+"""Project settings pointed at the benchmark database."""
+
+import os
+
+from commerce.settings import *  # noqa: F401,F403
+
+DATABASES["default"]["NAME"] = os.environ["BENCHMARK_DATABASE"]  # noqa: F405
+ALLOWED_HOSTS = ["127.0.0.1", "localhost", "testserver"]
@@ -0,0 +1,136 @@
+"""Concurrent read/write throughput of the SQLite profiles.
+
+Seeds a database file, then for each ``SQLITE_PROFILE`` runs ``--writers``
+processes placing bids (a listing read, then ``Listing.place_bid``) and
+``--readers`` processes loading the index page's listings, all at once, for
+``--seconds``. Each profile starts from its own copy of the same seeded file,
+in SQLite's default rollback-journal mode. Failed operations are the ones
+that still raised "database is locked" after the busy timeout and retries.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from . import setup_django
+from .data import create_database, generate
+
+PROFILES = ("default", "production")
+
+
+def worker(role, index, profile, path, seconds, barrier, results):
+    os.environ.update(
+        DJANGO_SETTINGS_MODULE="benchmarks.settings",
+        BENCHMARK_DATABASE=path,
+        SQLITE_PROFILE=profile,
+    )
+    setup_django()
+
+    from django.core.exceptions import ValidationError
+    from django.db import OperationalError
+
+    from auctions.models import Listing, User
+
+    rng = random.Random(index)
+    listing_ids = list(Listing.objects.values_list("pk", flat=True))
+    user = User.objects.order_by("pk")[index % User.objects.count()]
+    timings, failed = [], 0
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    while (start := time.perf_counter()) < deadline:
+        try:
+            if role == "write":
+                listing = Listing.objects.get(pk=rng.choice(listing_ids))
+                try:
+                    listing.place_bid(user, listing.price + 1)
+                except ValidationError:
+                    pass  # Outbid in between: still a completed transaction.
+            else:
+                list(Listing.objects.filter(active=True).order_by("-created")[:10])
+        except OperationalError:
+            failed += 1
+            continue
+        timings.append(time.perf_counter() - start)
+    results.put((role, timings, failed))
+
+
+def run_profile(profile, template, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "db.sqlite3")
+        shutil.copy(template, path)
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(args.writers + args.readers)
+        results = context.Queue()
+        roles = ["write"] * args.writers + ["read"] * args.readers
+        processes = [
+            context.Process(
+                target=worker,
+                args=(role, i, profile, path, args.seconds, barrier, results),
+            )
+            for i, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    stats = {}
+    for role in ("read", "write"):
+        timings = [t for r, ts, _ in collected if r == role for t in ts]
+        failed = sum(f for r, _, f in collected if r == role)
+        stats[role] = (timings, failed)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--listings", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.sqlite3")
+        # Seed in SQLite's defaults, so no profile inherits WAL mode.
+        os.environ["SQLITE_PROFILE"] = "default"
+        create_database(template)
+        generate(users=args.writers, listings=args.listings, bids=0, comments=0)
+        from django.db import connection
+
+        connection.close()
+
+        print(
+            f"{args.writers} writers, {args.readers} readers, {args.seconds:g} s "
+            "per profile"
+        )
+        print(
+            f"{'':12}{'reads/s':>9}{'writes/s':>10}{'write p50':>11}"
+            f"{'write p99':>11}{'failed':>8}"
+        )
+        for profile in PROFILES:
+            stats = run_profile(profile, template, args)
+            reads, _ = stats["read"]
+            writes, failed = stats["write"]
+            failed += stats["read"][1]
+            p50 = statistics.median(writes) * 1000 if writes else float("nan")
+            p99 = (
+                statistics.quantiles(writes, n=100)[98] * 1000
+                if len(writes) > 1
+                else float("nan")
+            )
+            print(
+                f"{profile:12}{len(reads) / args.seconds:>9.0f}"
+                f"{len(writes) / args.seconds:>10.0f}"
+                f"{p50:>9.1f}ms{p99:>9.1f}ms{failed:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Benchmark suite: the auction workflows against a stored baseline.
+
+Seeds a fresh SQLite database (see ``benchmarks.data``) and runs every
+scenario in ``benchmarks.scenarios`` through either the Django test client
+(``--target client``, which also counts queries per request) or a real local
+server (``--target wsgi`` / ``asgi``, one worker, sequential requests).
+
+Query counts are compared with ``benchmarks/baseline.json``, and the run
+fails when a scenario issues more queries per request than its baseline.
+Latencies depend on the machine, so they are only checked with
+``--check-latency``, against ``benchmarks/latency.local.json``: a baseline
+that ``--update-baseline`` records where the suite runs, and that is not
+committed. A scenario then fails when its median latency exceeds that
+baseline by more than ``--tolerance`` and by more than ``--latency-floor``
+milliseconds, so that small timings don't fail on noise alone.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from .concurrency import PROFILES, free_port
+from .data import create_database, generate
+from .scenarios import SCENARIOS
+
+BASELINE = Path(__file__).with_name("baseline.json")
+LATENCY_BASELINE = Path(__file__).with_name("latency.local.json")
+# What baseline.json records; the rest is machine-specific.
+QUERY_KEYS = ("queries", "requests")
+
+
+class ClientDriver:
+    """In-process requests through the test client, counting queries."""
+
+    def __init__(self):
+        self.clients = {}
+
+    def client(self, user_id):
+        from django.test import Client
+
+        from auctions.models import User
+
+        if user_id not in self.clients:
+            client = self.clients[user_id] = Client()
+            if user_id is not None:
+                client.force_login(User.objects.get(pk=user_id))
+        return self.clients[user_id]
+
+    def request(self, method, path, data, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = self.client(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.generic(method, path, **self.encode(method, data))
+            body = response.content
+        return response.status_code, body, len(queries)
+
+    @staticmethod
+    def encode(method, data):
+        if not data:
+            return {}
+        if method == "GET":
+            return {"QUERY_STRING": urlencode(data)}
+        return {
+            "data": urlencode(data),
+            "content_type": "application/x-www-form-urlencoded",
+        }
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    """HTTP requests to a server process, one keep-alive connection per user."""
+
+    CSRF_TOKEN = "benchmark" * 3 + "csrfs"  # Any 32 alphanumerics will do.
+
+    def __init__(self, profile):
+        self.port = free_port()
+        command = [part.format(port=self.port) for part in PROFILES[profile]]
+        self.server = subprocess.Popen(
+            [*command, "--workers", "1"],
+            env=dict(os.environ, PYTHONPATH=os.getcwd()),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.connections = {}
+        self.cookies = {}
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", self.port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+    def headers(self, user):
+        if user not in self.cookies:
+            cookies = {"csrftoken": self.CSRF_TOKEN}
+            if user is not None:
+                from django.conf import settings
+
+                session = ClientDriver().client(user).cookies
+                name = settings.SESSION_COOKIE_NAME
+                cookies[name] = session[name].value
+            self.cookies[user] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+        return {"Cookie": self.cookies[user], "X-CSRFToken": self.CSRF_TOKEN}
+
+    def request(self, method, path, data, user):
+        if user not in self.connections:
+            self.connections[user] = http.client.HTTPConnection(
+                "127.0.0.1", self.port, timeout=30
+            )
+        connection = self.connections[user]
+        headers, body = self.headers(user), None
+        if data and method == "GET":
+            path = f"{path}?{urlencode(data)}"
+        elif data:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, response.read(), None
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.server.terminate()
+        self.server.wait()
+
+
+def run_scenario(driver, scenario, data, iterations, seed):
+    samples = []
+
+    def call(method, path, params=None, user=None, expect=200):
+        start = time.perf_counter()
+        status, body, queries = driver.request(method, path, params, user)
+        samples.append(((time.perf_counter() - start) * 1000, queries))
+        if status != expect:
+            raise RuntimeError(f"{method} {path}: expected {expect}, got {status}")
+        return body
+
+    start = time.perf_counter()
+    scenario(call, data, random.Random(seed), iterations)
+    elapsed = time.perf_counter() - start
+
+    timings = sorted(ms for ms, _ in samples)
+    queries = [count for _, count in samples if count is not None]
+    return {
+        "requests": len(samples),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(statistics.quantiles(timings, n=100)[98], 3),
+        "throughput": round(len(samples) / elapsed, 1),
+        "queries": round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def compare(result, baseline, latency=None, tolerance=0.5, floor=2.0):
+    """Return the reasons ``result`` regressed against ``baseline``.
+
+    Latency is only compared when a ``latency`` baseline is given.
+    """
+    problems = []
+    if (
+        result["queries"] is not None
+        and baseline.get("queries") is not None
+        and result["queries"] > baseline["queries"] + 0.01
+    ):
+        problems.append(f"queries {baseline['queries']} -> {result['queries']}")
+    if latency is not None:
+        limit = max(latency["p50_ms"] * (1 + tolerance), latency["p50_ms"] + floor)
+        if result["p50_ms"] > limit:
+            problems.append(f"p50 {latency['p50_ms']} -> {result['p50_ms']} ms")
+    return problems
+
+
+def load(path):
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save(path, baselines):
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", choices=["client", *PROFILES], default="client")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply iterations.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--bids", type=int, default=10000)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--check-latency",
+        action="store_true",
+        help="Also fail on median latency regressions against --latency-baseline.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed relative increase of median latency (default 0.5).",
+    )
+    parser.add_argument(
+        "--latency-floor",
+        type=float,
+        default=2.0,
+        help="Allowed absolute increase of median latency in ms (default 2).",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--latency-baseline", type=Path, default=LATENCY_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        create_database(os.path.join(tmp, "db.sqlite3"))
+        data = generate(args.users, args.listings, args.bids, args.comments, args.seed)
+        driver = (
+            ClientDriver() if args.target == "client" else ServerDriver(args.target)
+        )
+        try:
+            results = {}
+            for name, (scenario, iterations) in SCENARIOS.items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                iterations = max(2, round(iterations * args.scale))
+                results[name] = run_scenario(
+                    driver, scenario, data, iterations, args.seed
+                )
+        finally:
+            driver.close()
+
+    baselines = load(args.baseline)
+    baseline = baselines.get(args.target, {})
+    latencies = load(args.latency_baseline)
+    latency = latencies.get(args.target, {}) if args.check_latency else {}
+    if args.check_latency and not latency and not args.update_baseline:
+        print(f"No {args.target} latency baseline in {args.latency_baseline}.")
+    failed = False
+    print(f"target: {args.target}")
+    print(
+        f"{'scenario':18}{'reqs':>6}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>8}"
+        f"{'queries':>9}{'base p50':>10}  status"
+    )
+    for name, result in results.items():
+        base = baseline.get(name)
+        base_latency = latency.get(name)
+        problems = (
+            compare(
+                result, base or {}, base_latency, args.tolerance, args.latency_floor
+            )
+            if base or base_latency
+            else []
+        )
+        failed = failed or bool(problems)
+        status = "; ".join(problems) or ("ok" if base else "no baseline")
+        queries = "-" if result["queries"] is None else f"{result['queries']:.2f}"
+        base_p50 = f"{base_latency['p50_ms']:.3f}" if base_latency else "-"
+        print(
+            f"{name:18}{result['requests']:>6}{result['p50_ms']:>9.3f}"
+            f"{result['p99_ms']:>9.3f}{result['throughput']:>8.1f}"
+            f"{queries:>9}{base_p50:>10}  {status}"
+        )
+
+    if args.update_baseline:
+        baselines[args.target] = {
+            **baseline,
+            **{
+                name: {key: result[key] for key in QUERY_KEYS}
+                for name, result in results.items()
+            },
+        }
+        save(args.baseline, baselines)
+        latencies[args.target] = {**latencies.get(args.target, {}), **results}
+        save(args.latency_baseline, latencies)
+        print(f"Baselines written to {args.baseline} and {args.latency_baseline}")
+    elif failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
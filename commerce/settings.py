@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "auctions.middleware.StaticFilesMiddleware",
+    "auctions.middleware.MetricsMiddleware",
+    "auctions.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,14 +54,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
 ROOT_URLCONF = "commerce.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "auctions.metrics.TimedDjangoTemplates",
+        # Keeps the default alias, which follows the backend's module name.
+        "NAME": "django",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -95,6 +99,90 @@ if os.getenv("DATABASE_URL") and not DEBUG:
 else:
     print("Using SQLite database")
 
+# "production" tunes SQLite for concurrent use: WAL, relaxed fsyncs, a busy
+# timeout and BEGIN IMMEDIATE write transactions (see auctions.db).
+# "default" leaves SQLite's own settings.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+if (
+    DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+    and SQLITE_PROFILE == "production"
+):
+    DATABASES["default"].setdefault("OPTIONS", {})["transaction_mode"] = "IMMEDIATE"
+
+# Read replicas, as comma-separated URLs (e.g. "postgres://...,postgres://..."
+# or "sqlite:////path/replica.sqlite3"), added as "replica1", "replica2"...
+# Reads that can be stale go to them; see auctions.routers.
+DATABASE_REPLICAS = []
+for url in filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(",")):
+    alias = f"replica{len(DATABASE_REPLICAS) + 1}"
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    # Tests run against the primary's test database only.
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["auctions.routers.ReplicaRouter"]
+# Seconds a user's reads stay on the primary after they write: longer than
+# the replication lag.
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# Local-memory by default. Point CACHE_BACKEND/CACHE_LOCATION at e.g.
+# django.core.cache.backends.filebased.FileBasedCache or
+# django.core.cache.backends.db.DatabaseCache (run createcachetable first)
+# to share the cache between worker processes.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Sessions are read from the cache and written to the database only when
+# they change (see auctions.sessions). A logout deletes the session from the
+# cache of its own process only, so with several worker processes this needs
+# a cache shared between them; otherwise sessions are read from the database.
+_SHARED_CACHE = CACHES["default"]["BACKEND"] != (
+    "django.core.cache.backends.locmem.LocMemCache"
+)
+_SINGLE_PROCESS = int(os.getenv("WEB_CONCURRENCY", "1")) <= 1
+SESSION_ENGINE = os.getenv(
+    "SESSION_ENGINE",
+    (
+        "auctions.sessions"
+        if _SHARED_CACHE or _SINGLE_PROCESS
+        else "django.contrib.sessions.backends.db"
+    ),
+)
+# Seconds before a session whose data did not change is written again.
+SESSION_WRITE_INTERVAL = 60
+
+# Messages travel in a signed cookie; only those too large for it are stored
+# in the session.
+MESSAGE_STORAGE = "django.contrib.messages.storage.fallback.FallbackStorage"
+
+# Seconds anonymous index/categories pages stay cached; 0 disables the cache.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = int(os.getenv("ANONYMOUS_PAGE_CACHE_TIMEOUT", "30"))
+
+# Broker fanning live listing events out to WebSocket subscribers. The
+# in-process default only reaches clients connected to the same ASGI process.
+LIVE_UPDATES_BROKER = os.getenv("LIVE_UPDATES_BROKER", "auctions.live.InProcessBroker")
+
+# Besides staff users, /metrics accepts "Authorization: Bearer <token>" for
+# Prometheus scrapers when this is set.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Listing image thumbnails (see auctions.thumbnails): where they are kept,
+# how many bytes before the least recently used are deleted, and the class
+# that fetches the originals. auctions.thumbnails.LocalFileFetcher reads
+# them from THUMBNAIL_LOCAL_ROOT instead.
+THUMBNAIL_ROOT = os.getenv("THUMBNAIL_ROOT", os.path.join(BASE_DIR, "thumbnails"))
+THUMBNAIL_CACHE_SIZE = int(os.getenv("THUMBNAIL_CACHE_SIZE", str(512 * 1024 * 1024)))
+THUMBNAIL_FETCHER = os.getenv("THUMBNAIL_FETCHER", "auctions.thumbnails.HTTPFetcher")
+THUMBNAIL_LOCAL_ROOT = os.getenv("THUMBNAIL_LOCAL_ROOT", "")
+
 AUTH_USER_MODEL = "auctions.User"
 
 # Password validation
@@ -140,6 +228,14 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "auctions/static"),
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# STATICFILES_STORAGE is no longer read by Django 5.1. collectstatic writes the
+# CSS bundles (see auctions.assets) and WhiteNoise's hashed, gzip and brotli
+# copies of every file.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "auctions.assets.BundledStaticFilesStorage"},
+}
 
-django_heroku.settings(locals())
+# Static files are configured above; django_heroku would otherwise prepend
+# the sync-only WhiteNoiseMiddleware, which serialises async views under ASGI.
+django_heroku.settings(locals(), staticfiles=False)